@@ -0,0 +1,74 @@
+import argparse
+import importlib
+import sys
+import time
+
+from batch import ENGINES
+from validate import ValidationError
+from writer import FORMATS
+
+# Single entry point for generating an ACM document with either engine.
+# Engine modules are only imported once chosen, so the csv engine never
+# pays for importing pandas. csv is the default: benchmark.py has it ahead
+# of the pandas engine from the smallest deployments to the largest.
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the ACM document for one deployment.")
+    parser.add_argument("input_dir", nargs="?", default="input_csv")
+    parser.add_argument("output", nargs="?", default="output/output.json")
+    parser.add_argument("--deployment-id")
+    parser.add_argument("--engine", default="csv", choices=list(ENGINES))
+    parser.add_argument("--format", default="pretty", choices=list(FORMATS))
+    parser.add_argument("--stream", action="store_true", help="build list sections while they are written")
+    parser.add_argument("--workers", type=int, help="parallel table readers (1 reads sequentially)")
+    parser.add_argument("--processes", action="store_true", help="read tables in processes instead of threads")
+    parser.add_argument("--compact", action="store_true", help="load the wide tables as compact rows")
+    parser.add_argument("--cache-dir", help="reuse sections rendered by earlier runs from this directory")
+    parser.add_argument("--memory-budget", type=float,
+                        help="read the location tables in chunks of about this many MB of parsed rows")
+    parser.add_argument("--snapshot-dir", help="keep binary snapshots of the parsed tables in this directory")
+    parser.add_argument("--validate", nargs="?", const="inline", choices=["inline", "thread"],
+                        help="check the output against the schema while writing it")
+    parser.add_argument("--check-references", action="store_true",
+                        help="warn about references to missing rows between the input tables")
+    parser.add_argument("--metrics", help="write per-stage metrics to this JSON file")
+    parser.add_argument("--prometheus", help="write per-stage metrics to this Prometheus textfile")
+    parser.add_argument("--trace-memory", action="store_true", help="record peak memory (slow)")
+    parser.add_argument("--profile", help="write cProfile stats to this file")
+    args = parser.parse_args(argv)
+
+    engine_name = args.engine
+    engine = importlib.import_module(ENGINES[engine_name])
+    deployment_id = args.deployment_id or engine.DEFAULT_DEPLOYMENT
+
+    metrics = None
+    if args.metrics or args.prometheus or args.trace_memory or args.profile:
+        from metrics import Metrics
+        metrics = Metrics(engine_name, deployment_id, trace_memory=args.trace_memory, profile_file=args.profile)
+
+    started = time.perf_counter()
+    try:
+        engine.generate_json(
+            args.input_dir, args.output, workers=args.workers, processes=args.processes, stream=args.stream,
+            cache_dir=args.cache_dir, deployment_id=deployment_id, output_format=args.format,
+            compact=args.compact, validate={"inline": True, "thread": "thread"}.get(args.validate, False),
+            metrics=metrics, memory_budget=args.memory_budget and int(args.memory_budget * 2 ** 20),
+            snapshot_dir=args.snapshot_dir, check_references=args.check_references,
+        )
+        print(f"Wrote {args.output} in {time.perf_counter() - started:.3f}s")
+    except ValidationError as e:
+        # The previous output was left in place
+        print(f"Error: {e}")
+        return 1
+    finally:
+        if metrics is not None:
+            if args.metrics:
+                metrics.write_json(args.metrics)
+            if args.prometheus:
+                metrics.write_prometheus(args.prometheus)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import argparse
+import json
+import sys
+from bisect import bisect_left
+from difflib import SequenceMatcher
+
+from acm_diff import item_key, key_field
+
+# Delta publishing between two generations of the ACM document. The delta is
+# an RFC 6902 JSON Patch, but lists of objects are aligned on their natural
+# key (see acm_diff.KEY_FIELDS) before any index is written, so inserting or
+# dropping one channel is a single add/remove op instead of a replace of
+# every channel after it, and reordering channels is a move op per channel
+# that left its place.
+
+
+def _pointer(parts):
+    return "".join("/" + str(part).replace("~", "~0").replace("/", "~1") for part in parts)
+
+
+def make_patch(old, new, path=(), ops=None):
+    if ops is None:
+        ops = []
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": _pointer(path + (key,))})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": _pointer(path + (key,)), "value": value})
+            else:
+                make_patch(old[key], value, path + (key,), ops)
+    elif isinstance(old, list) and isinstance(new, list):
+        if old != new and not _patch_list(old, new, path, ops):
+            ops.append({"op": "replace", "path": _pointer(path), "value": new})
+    elif type(old) is not type(new) or old != new:
+        ops.append({"op": "replace", "path": _pointer(path), "value": new})
+    return ops
+
+
+def _patch_list(old, new, path, ops):
+    # Returns False when the lists can't be aligned (scalar lists); the
+    # caller then replaces the whole list.
+    old_fields, new_fields = key_field(old), key_field(new)
+    if old_fields is None or new_fields is None or old_fields[0] != new_fields[0]:
+        return _patch_sequence(old, new, path, ops)
+
+    old_keys = [item_key(item, old_fields) for item in old]
+    new_keys = [item_key(item, new_fields) for item in new]
+    new_set, old_set = set(new_keys), set(old_keys)
+    old_by_key = dict(zip(old_keys, old))
+    # Removals from the back so earlier indexes stay valid, then moves of the
+    # kept items into their new order, then inserts in ascending order of
+    # their final position, then in-place changes.
+    for i in range(len(old_keys) - 1, -1, -1):
+        if old_keys[i] not in new_set:
+            ops.append({"op": "remove", "path": _pointer(path + (i,))})
+    _move_ops([key for key in old_keys if key in new_set], [key for key in new_keys if key in old_set], path, ops)
+    for j, key in enumerate(new_keys):
+        if key not in old_set:
+            ops.append({"op": "add", "path": _pointer(path + (j,)), "value": new[j]})
+    for j, key in enumerate(new_keys):
+        if key in old_set:
+            make_patch(old_by_key[key], new[j], path + (j,), ops)
+    return True
+
+
+def _move_ops(current, target, path, ops):
+    # Moves the keys of current (the same set as target) into target order.
+    # The longest run of keys already in target order stays in place; every
+    # other key is moved to just after its predecessor in target.
+    positions = {key: i for i, key in enumerate(current)}
+    stable = {target[j] for j in _increasing_run([positions[key] for key in target])}
+    current = list(current)
+    for j, key in enumerate(target):
+        if key in stable:
+            continue
+        source = current.index(key)
+        del current[source]
+        destination = current.index(target[j - 1]) + 1 if j else 0
+        current.insert(destination, key)
+        if source != destination:
+            ops.append({"op": "move", "from": _pointer(path + (source,)), "path": _pointer(path + (destination,))})
+
+
+def _increasing_run(values):
+    # Indexes of a longest strictly increasing subsequence of values
+    tails, tail_values, previous = [], [], []
+    for i, value in enumerate(values):
+        k = bisect_left(tail_values, value)
+        previous.append(tails[k - 1] if k else None)
+        if k == len(tails):
+            tails.append(i)
+            tail_values.append(value)
+        else:
+            tails[k] = i
+            tail_values[k] = value
+    run, i = [], tails[-1] if tails else None
+    while i is not None:
+        run.append(i)
+        i = previous[i]
+    return run[::-1]
+
+
+def _patch_sequence(old, new, path, ops):
+    # Lists without a natural key are aligned on item content instead.
+    # Opcodes are applied back to front so the old indexes stay valid.
+    if not all(isinstance(v, (dict, list)) for v in old + new):
+        return False
+    old_hashes = [json.dumps(item, sort_keys=True) for item in old]
+    new_hashes = [json.dumps(item, sort_keys=True) for item in new]
+    opcodes = SequenceMatcher(None, old_hashes, new_hashes, autojunk=False).get_opcodes()
+    for tag, i1, i2, j1, j2 in reversed(opcodes):
+        if tag == "equal":
+            continue
+        for i in range(i2 - 1, i1 - 1, -1):
+            ops.append({"op": "remove", "path": _pointer(path + (i,))})
+        for offset, item in enumerate(new[j1:j2]):
+            ops.append({"op": "add", "path": _pointer(path + (i1 + offset,)), "value": item})
+    return True
+
+
+def _parse_pointer(pointer):
+    if not pointer:
+        return []
+    return [part.replace("~1", "/").replace("~0", "~") for part in pointer[1:].split("/")]
+
+
+def _child(container, part):
+    return container[int(part)] if isinstance(container, list) else container[part]
+
+
+def _locate(doc, pointer):
+    # (container, key or list index) of the value a pointer refers to
+    parts = _parse_pointer(pointer)
+    parent = doc
+    for part in parts[:-1]:
+        parent = _child(parent, part)
+    last = parts[-1]
+    if isinstance(parent, list):
+        last = len(parent) if last == "-" else int(last)
+    return parent, last
+
+
+def apply_patch(doc, patch):
+    # Applies the ops in place and returns the document. Only the ops
+    # make_patch emits (add, remove, replace, move) are supported.
+    for op in patch:
+        if not op["path"]:
+            if op["op"] == "replace":
+                doc = op["value"]
+                continue
+            raise ValueError(f"Unsupported op on the document root: {op['op']}")
+        if op["op"] == "move":
+            parent, last = _locate(doc, op["from"])
+            value = parent.pop(last)
+            kind = "add"
+        elif op["op"] in ("add", "remove", "replace"):
+            value, kind = op.get("value"), op["op"]
+        else:
+            raise ValueError(f"Unsupported patch op: {op['op']}")
+        parent, last = _locate(doc, op["path"])
+        if kind == "remove":
+            del parent[last]
+        elif kind == "add" and isinstance(parent, list):
+            parent.insert(last, value)
+        else:
+            parent[last] = value
+    return doc
+
+
+def _load(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _dump(value, path):
+    with open(path, "w") as f:
+        json.dump(value, f, separators=(",", ":"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute or apply a JSON Patch between two ACM generations.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    diff_parser = commands.add_parser("diff", help="write the patch that turns OLD into NEW")
+    diff_parser.add_argument("old")
+    diff_parser.add_argument("new")
+    diff_parser.add_argument("-o", "--output", required=True)
+    apply_parser = commands.add_parser("apply", help="rebuild the full document from OLD and a patch")
+    apply_parser.add_argument("old")
+    apply_parser.add_argument("patch")
+    apply_parser.add_argument("-o", "--output", required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == "diff":
+        patch = make_patch(_load(args.old), _load(args.new))
+        _dump(patch, args.output)
+        print(f"{len(patch)} operations written to {args.output}")
+    else:
+        doc = apply_patch(_load(args.old), _load(args.patch))
+        with open(args.output, "w") as f:
+            json.dump(doc, f, indent=4)
+        print(f"Document written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+import argparse
+import json
+import sys
+
+# Structural diff of two ACM documents. Lists of objects are matched by
+# their natural key rather than by position (channels by serviceId/id,
+# lineups by channelMapGroup, providers by key, classifications by genreId,
+# ...), so the whole document is compared in a single linear pass and an
+# inserted channel shows up as one addition instead of a cascade of changes.
+
+# Tried in order; the first field present and unique on every item of a
+# list becomes that list's key. serviceId and id are interchangeable so a
+# generated channel (id) still lines up with a reference channel (serviceId).
+# A tuple of fields is a composite key: a provider key is shared by the
+# group, display and content providers of one brand, so providers are keyed
+# by type and key (type/key in the reference, Type/ProviderKey generated).
+KEY_FIELDS = (
+    ("serviceId", "id"),
+    ("channelMapGroup",),
+    ("genreId",),
+    (("type", "key"), ("Type", "ProviderKey")),
+    ("key",),
+    ("providerId",),
+    ("ruleId",),
+    ("materialId",),
+    ("lsa",),
+    ("cityId",),
+    ("termId",),
+)
+
+
+def key_field(items):
+    if not items or not all(isinstance(item, dict) for item in items):
+        return None
+    for fields in KEY_FIELDS:
+        for field in fields:
+            values = [_field_value(item, field) for item in items]
+            if None not in values and len(set(values)) == len(values):
+                return fields
+    return None
+
+
+def field_name(field):
+    return "/".join(field) if isinstance(field, tuple) else field
+
+
+def _field_value(item, field):
+    if not isinstance(field, tuple):
+        return _hashable(item[field]) if field in item and item[field] is not None else None
+    values = [item.get(name) for name in field]
+    return None if None in values else "/".join(map(str, values))
+
+
+def _hashable(value):
+    return value if isinstance(value, (str, int, float, bool)) else json.dumps(value, sort_keys=True)
+
+
+def item_key(item, fields):
+    for field in fields:
+        value = _field_value(item, field)
+        if value is not None:
+            return value
+    return None
+
+
+def index_by(items, fields):
+    return {item_key(item, fields): item for item in items}
+
+
+def _change(changes, kind, path, left=None, right=None):
+    change = {"path": path, "kind": kind}
+    if kind != "added":
+        change["left"] = left
+    if kind != "removed":
+        change["right"] = right
+    changes.append(change)
+
+
+def diff(left, right, path="$", changes=None):
+    if changes is None:
+        changes = []
+    if isinstance(left, dict) and isinstance(right, dict):
+        for key, value in left.items():
+            if key not in right:
+                _change(changes, "removed", f"{path}.{key}", left=value)
+            else:
+                diff(value, right[key], f"{path}.{key}", changes)
+        for key, value in right.items():
+            if key not in left:
+                _change(changes, "added", f"{path}.{key}", right=value)
+    elif isinstance(left, list) and isinstance(right, list):
+        _diff_list(left, right, path, changes)
+    elif type(left) is not type(right) or left != right:
+        _change(changes, "changed", path, left, right)
+    return changes
+
+
+def _diff_list(left, right, path, changes):
+    if left == right:
+        return
+    left_key, right_key = key_field(left), key_field(right)
+    if left_key is None or right_key is None or left_key[0] != right_key[0]:
+        if all(not isinstance(v, (dict, list)) for v in left + right) or len(left) != len(right):
+            _change(changes, "changed", path, left, right)
+        else:
+            for i, (a, b) in enumerate(zip(left, right)):
+                diff(a, b, f"{path}[{i}]", changes)
+        return
+
+    name = field_name(left_key[0])
+    left_index, right_index = index_by(left, left_key), index_by(right, right_key)
+    for key, item in left_index.items():
+        item_path = f"{path}[{name}={key}]"
+        if key not in right_index:
+            _change(changes, "removed", item_path, left=item)
+        else:
+            diff(item, right_index[key], item_path, changes)
+    for key, item in right_index.items():
+        if key not in left_index:
+            _change(changes, "added", f"{path}[{name}={key}]", right=item)
+
+
+def summarize(changes):
+    summary = {}
+    for change in changes:
+        section = change["path"].split(".")[1].split("[")[0] if "." in change["path"] else "$"
+        counts = summary.setdefault(section, {"added": 0, "removed": 0, "changed": 0})
+        counts[change["kind"]] += 1
+    return summary
+
+
+def _short(value, width=80):
+    text = json.dumps(value, ensure_ascii=False)
+    return text if len(text) <= width else text[:width - 3] + "..."
+
+
+def format_text(changes, limit=None):
+    lines = []
+    for section, counts in summarize(changes).items():
+        lines.append(f"{section}: {counts['added']} added, {counts['removed']} removed, {counts['changed']} changed")
+    if lines:
+        lines.append("")
+    for change in changes[:limit]:
+        if change["kind"] == "added":
+            lines.append(f"+ {change['path']}: {_short(change['right'])}")
+        elif change["kind"] == "removed":
+            lines.append(f"- {change['path']}: {_short(change['left'])}")
+        else:
+            lines.append(f"~ {change['path']}: {_short(change['left'])} -> {_short(change['right'])}")
+    if limit is not None and len(changes) > limit:
+        lines.append(f"... {len(changes) - limit} more")
+    return "\n".join(lines) if changes else "Documents are identical."
+
+
+def diff_files(left_file, right_file):
+    with open(left_file, "r") as f:
+        left = json.load(f)
+    with open(right_file, "r") as f:
+        right = json.load(f)
+    return diff(left, right)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Structural diff of two ACM JSON documents.")
+    parser.add_argument("left", nargs="?", default="output/output.json")
+    parser.add_argument("right", nargs="?", default="asm_json/acm_out_IE_starhub_010825.json")
+    parser.add_argument("--json", help="also write the full change list to this file")
+    parser.add_argument("--limit", type=int, default=200, help="max changes printed (default 200)")
+    args = parser.parse_args(argv)
+
+    changes = diff_files(args.left, args.right)
+    print(format_text(changes, args.limit))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summary": summarize(changes), "changes": changes}, f, indent=4)
+    return 1 if changes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
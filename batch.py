@@ -0,0 +1,159 @@
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from section_cache import input_digests
+from writer import write_json
+
+ENGINES = {
+    "csv": "generate_json",
+    "pandas": "generate_json_pandas",
+}
+
+# Tables parsed once in the parent and shared with every worker, keyed by
+# (engine, table name, file digest). Filled in by _init_worker.
+_SHARED = {}
+
+
+def load_manifest(path):
+    # A manifest is a JSON list of deployments (or {"deployments": [...]}),
+    # each with input_dir, deployment_id, output and an optional engine and
+    # format. Relative paths are resolved against the manifest's directory.
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    if isinstance(manifest, dict):
+        manifest = manifest["deployments"]
+    base = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    for entry in manifest:
+        jobs.append({
+            "deployment_id": entry["deployment_id"],
+            "input_dir": os.path.join(base, entry["input_dir"]),
+            "output": os.path.join(base, entry["output"]),
+            "engine": entry.get("engine", "csv"),
+            "format": entry.get("format", "pretty"),
+        })
+    return jobs
+
+
+def _init_worker(shared):
+    _SHARED.update(shared)
+
+
+def _run(job, snapshot_dir=None):
+    started = time.perf_counter()
+    engine = importlib.import_module(ENGINES[job["engine"]])
+    readers = engine.table_readers(snapshot_dir=snapshot_dir)
+    data = {}
+    reused = 0
+    for name, digest in job["digests"].items():
+        shared = _SHARED.get((job["engine"], name, digest))
+        if shared is not None:
+            data[name] = shared
+            reused += 1
+        else:
+            data[name] = readers[name](job["input_dir"])
+    loaded = time.perf_counter()
+
+    sections = engine.build_sections(data, stream=True, deployment_id=job["deployment_id"])
+    write_json(sections, job["output"], output_format=job["format"])
+    finished = time.perf_counter()
+
+    return {
+        "deployment_id": job["deployment_id"],
+        "output": job["output"],
+        "engine": job["engine"],
+        "shared_tables": reused,
+        "load_seconds": round(loaded - started, 4),
+        "render_seconds": round(finished - loaded, 4),
+        "total_seconds": round(finished - started, 4),
+    }
+
+
+def shared_tables(jobs, snapshot_dir=None):
+    # Parses every table whose file content is identical across at least two
+    # deployments of the same engine, once. A table that fails to parse is
+    # left out, so each deployment's worker reads it itself and the
+    # deployments that cannot are reported as failed.
+    counts = Counter(
+        (job["engine"], name, digest) for job in jobs for name, digest in job["digests"].items()
+    )
+    shared = {}
+    unshared = set()
+    for job in jobs:
+        engine = importlib.import_module(ENGINES[job["engine"]])
+        for name, digest in job["digests"].items():
+            key = (job["engine"], name, digest)
+            if counts[key] > 1 and key not in shared and key not in unshared and digest != "missing":
+                try:
+                    shared[key] = engine.table_readers(snapshot_dir=snapshot_dir)[name](job["input_dir"])
+                except Exception as e:
+                    print(f"Warning: Could not share {name} from {job['input_dir']}: {type(e).__name__}: {e}")
+                    unshared.add(key)
+    return shared
+
+
+def run_batch(jobs, workers=None, snapshot_dir=None):
+    # With a snapshot_dir, tables parsed by any earlier run or worker are
+    # memory-mapped from there instead of parsed again
+    for job in jobs:
+        engine = importlib.import_module(ENGINES[job["engine"]])
+        job["digests"] = input_digests(job["input_dir"], engine.READERS)
+    shared = shared_tables(jobs, snapshot_dir)
+
+    # A deployment that raises is reported in "failed" with its error; the
+    # others still run and keep their outputs
+    started = time.perf_counter()
+    outcomes = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared,)) as pool:
+        futures = {pool.submit(_run, job, snapshot_dir): i for i, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                outcomes[i] = future.result()
+            except Exception as e:
+                job = jobs[i]
+                outcomes[i] = {
+                    "deployment_id": job["deployment_id"],
+                    "output": job["output"],
+                    "engine": job["engine"],
+                    "error": f"{type(e).__name__}: {e}",
+                }
+    return {
+        "deployments": [outcome for outcome in outcomes if "error" not in outcome],
+        "failed": [outcome for outcome in outcomes if "error" in outcome],
+        "shared_tables": len(shared),
+        "total_seconds": round(time.perf_counter() - started, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate ACM documents for many deployments in parallel.")
+    parser.add_argument("manifest")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--report", help="write the timing report to this JSON file")
+    parser.add_argument("--snapshot-dir", help="keep binary snapshots of the parsed tables in this directory")
+    args = parser.parse_args()
+
+    report = run_batch(load_manifest(args.manifest), workers=args.workers, snapshot_dir=args.snapshot_dir)
+    for result in report["deployments"]:
+        print(f"{result['deployment_id']}: {result['total_seconds']:.3f}s "
+              f"(load {result['load_seconds']:.3f}s, render {result['render_seconds']:.3f}s, "
+              f"{result['shared_tables']} shared tables) -> {result['output']}")
+    for result in report["failed"]:
+        print(f"{result['deployment_id']}: failed, {result['error']}")
+    print(f"{len(report['deployments'])} deployments in {report['total_seconds']:.3f}s"
+          + (f", {len(report['failed'])} failed" if report["failed"] else ""))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=4)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+import argparse
+import importlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from batch import ENGINES
+from tables import TABLES
+from urls import url_rewriter
+from writer import is_stream, write_json
+
+# Synthesizes input directories of a chosen size and times both engines on
+# them, stage by stage. Headers are copied from the bundled input_csv set so
+# the synthetic files have the same schema as a real deployment.
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "input_csv")
+
+APP_CALLS = ["deeplink", "trigger", "delay", "displaytime", "repeat", "channelbound", "applogo",
+             "synopsis.en-IE", "toastermessage.en-IE"]
+STREAMING_PROTOCOLS = ["dash", "hls"]
+IMAGE_PREFIX = "https://static.example.invalid/image-service/ImagesEPG/EventImages/"
+# URL rewriting rules (see urls.py): logos given as a placeholder get
+# IMAGE_PREFIX in its place, and the OTT URLs move to the bench CDN host
+ENDPOINTS_FILE = "endpoints_synthetic.cfg"
+ENDPOINTS = {
+    "endpoints": {"Poster_URI_ToBeReplaced1": "file:///", "Poster_URI_ToBeReplaced2": "file://",
+                  "Poster_URI_ToBePrefixed": IMAGE_PREFIX},
+    "hosts": {"cdn.example.invalid": "cdn.bench.example.invalid"},
+}
+
+
+def _template_header(spec):
+    with open(os.path.join(TEMPLATE_DIR, spec.file), "r", encoding="utf-8-sig") as f:
+        return [f.readline().rstrip("\r\n").split(spec.delimiter) for _ in range(spec.header_rows)]
+
+
+def _write(input_dir, name, rows, header=None):
+    spec = TABLES[name]
+    header = [header] if header else _template_header(spec)
+    with open(os.path.join(input_dir, spec.file), "w", encoding="utf-8-sig") as f:
+        for row in header + rows:
+            f.write(spec.delimiter.join(str(v) for v in row) + "\n")
+
+
+def _row(header, **values):
+    return [values.get(column.strip(), "") for column in header]
+
+
+def synthesize(input_dir, channels=250, regions=10, ott_per_channel=2, apps_density=0.12,
+               avad_density=0.02, tstv_density=0.6, trickplay_density=0.01, providers=90, seed=0):
+    rng = random.Random(seed)
+    os.makedirs(input_dir, exist_ok=True)
+    service_ids = [f"SYNSVC{i:06d}" for i in range(channels)]
+    region_names = ["Default"] + [f"Region{i:04d}" for i in range(1, regions)]
+    lsas = [str(40000 + i) for i in range(regions)]
+
+    shutil.copy(os.path.join(TEMPLATE_DIR, TABLES["service_genres"].file), input_dir)
+    genre_ids = [str(i) for i in range(1, 12)]
+
+    header = _template_header(TABLES["channels"])[0]
+    _write(input_dir, "channels", [
+        _row(header, ServiceId=sid, Name=f"Channel {i}", EPGSourceID=str(20000 + i),
+             FocusedLogo=f"file:///{sid}_f.png" if i % 2 else f"{IMAGE_PREFIX}{sid}_f.png", ServiceLanguage="en-IE", Resolution=rng.choice(["SD", "HD"]),
+             ServiceGenre=",".join(rng.sample(genre_ids, rng.randint(1, 3))), ProviderName=f"Provider{i % providers}",
+             LinearProducts=f"crid://example.invalid/lp/{i % 50}", ReplayProductizingRules=f"SR_{i}")
+        for i, sid in enumerate(service_ids)
+    ])
+
+    # One column per channel map group, as in the real wide lineup sheet
+    _write(input_dir, "channel_lineup", [
+        [sid] + [str(100 + i) if rng.random() < 0.9 else "NA" for _ in region_names]
+        for i, sid in enumerate(service_ids)
+    ], header=["ServiceID"] + region_names)
+
+    header = _template_header(TABLES["qam_locations"])[0]
+    _write(input_dir, "qam_locations", [
+        _row(header, ServiceId=sid, QAMRegion=lsa, Frequency=str(150000000 + 8000000 * (i % 40)),
+             SymbolRate=rng.choice(["6875000", "6887000"]), Modulation="5", FecInner="0", FecOuter="0",
+             ProgramNbr=str(100 + i % 900), CpeType="EOS")
+        for i, sid in enumerate(service_ids) for lsa in lsas
+    ])
+
+    header = _template_header(TABLES["ott_locations"])[0]
+    _write(input_dir, "ott_locations", [
+        _row(header, ServiceId=sid, StreamingProtocol=STREAMING_PROTOCOLS[k % 2],
+             IPLocationURL=f"https://cdn.example.invalid/live/{sid}/{k}.mpd", DRMProtectionKey=str(10000000 + i))
+        for i, sid in enumerate(service_ids) for k in range(ott_per_channel)
+    ])
+
+    _write(input_dir, "linear_products", [
+        [f"crid://example.invalid/lp/{i}", str(16888000 + i), "", "", ""] for i in range(50)
+    ])
+    _write(input_dir, "replay_products", [
+        [f"crid://example.invalid/replayproduct/SR_{i}", str(10000000 + i)] for i in range(channels)
+    ])
+
+    _write(input_dir, "apps", [
+        [sid, call, f"{call}-{sid}" if call not in ("delay", "displaytime", "repeat") else str(rng.randint(0, 9))]
+        for sid in service_ids if rng.random() < apps_density for call in APP_CALLS
+    ])
+
+    header = _template_header(TABLES["providers"])[0]
+    _write(input_dir, "providers", [
+        _row(header, ProviderKey=str(1000 + i), ProviderName=f"Provider{i}", ProviderId=str(1000 + i), Type="content")
+        for i in range(providers)
+    ])
+
+    header = _template_header(TABLES["avad"])[0]
+    _write(input_dir, "avad", [
+        _row(header, ServiceId=sid, AVADEnabled="1", AVADAdSupport="linear", AVADAdCPEPlatform="APOLLO")
+        for sid in service_ids if rng.random() < avad_density
+    ])
+
+    header = _template_header(TABLES["tstv"])[0]
+    _write(input_dir, "tstv", [
+        _row(header, rule="productizing", ruleTag=f"SR_{i}",
+             productId=f"crid://example.invalid/replayproduct/SR_{i}", assetizingRule="ABR_265_Replay-7")
+        for i in range(channels) if rng.random() < tstv_density
+    ])
+
+    header = _template_header(TABLES["trickplaycontrol"])[0]
+    _write(input_dir, "trickplaycontrol", [
+        _row(header, ChannelIdProviderKey=sid, ContentType=content, BreakArea="allBreaks", SCTESegmentationCodes="none")
+        for sid in service_ids if rng.random() < trickplay_density for content in ("recordings", "replay", "startover")
+    ])
+
+    _write(input_dir, "city_mapping", [
+        [str(100 + i), region, lsa] for i, (region, lsa) in enumerate(zip(region_names, lsas))
+    ])
+
+    with open(os.path.join(input_dir, ENDPOINTS_FILE), "w", encoding="utf-8") as f:
+        for section, options in ENDPOINTS.items():
+            f.write(f"[{section}]\n" + "".join(f"{name} = {value}\n" for name, value in options.items()) + "\n")
+    return input_dir
+
+
+def _measure(fn, memory):
+    if memory:
+        tracemalloc.start()
+    started_wall, started_cpu = time.perf_counter(), time.process_time()
+    result = fn()
+    stage = {
+        "seconds": round(time.perf_counter() - started_wall, 6),
+        "cpu_seconds": round(time.process_time() - started_cpu, 6),
+    }
+    if memory:
+        stage["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, stage
+
+
+def profile_engine(engine_name, input_dir, output_file, memory=False, output_format="pretty", compact=False):
+    engine = importlib.import_module(ENGINES[engine_name])
+    stages = {}
+    started = time.perf_counter()
+
+    data = {}
+    for name, read in (engine.COMPACT_READERS if compact else engine.READERS).items():
+        data[name], stages[f"read:{name}"] = _measure(lambda: read(input_dir), memory)
+
+    sections = engine.build_sections(data, stream=True)
+    for key, value in sections.items():
+        if is_stream(value):
+            sections[key], stages[f"build:{key}"] = _measure(lambda: list(value), memory)
+        elif callable(value):
+            sections[key], stages[f"build:{key}"] = _measure(value, memory)
+
+    _, stages["serialize"] = _measure(lambda: write_json(sections, output_file, output_format), memory)
+    total = round(time.perf_counter() - started, 6)
+    url_rewrites = dict(url_rewriter(data).hits)
+
+    # End to end in streaming mode, which is what bounds peak memory.
+    def streamed():
+        write_json(engine.build_sections(data, stream=True), output_file, output_format)
+    _, stages["stream:build+serialize"] = _measure(streamed, memory)
+
+    return {
+        "stages": stages,
+        "total_seconds": total,
+        "output_bytes": os.path.getsize(output_file),
+        "url_rewrites": url_rewrites,
+    }
+
+
+def run(scales, engines, memory=False, output_format="pretty", work_dir=None, compact=False):
+    report = {"format": output_format, "memory": memory, "compact": compact, "runs": []}
+    work_dir = work_dir or tempfile.mkdtemp(prefix="acm-bench-")
+    for scale in scales:
+        input_dir = synthesize(os.path.join(work_dir, "c{channels}-r{regions}".format(**scale)), **scale)
+        for engine_name in engines:
+            output_file = os.path.join(input_dir, f"out-{engine_name}.json")
+            result = profile_engine(engine_name, input_dir, output_file, memory, output_format, compact)
+            report["runs"].append({"engine": engine_name, "scale": scale, **result})
+            print(f"{engine_name:>6} channels={scale['channels']:<7} regions={scale['regions']:<4} "
+                  f"{result['total_seconds']:.3f}s {result['output_bytes']} bytes")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ACM generators on synthetic deployments.")
+    parser.add_argument("--channels", type=int, nargs="+", default=[250, 2500])
+    parser.add_argument("--regions", type=int, nargs="+", default=[10])
+    parser.add_argument("--ott-per-channel", type=int, default=2)
+    parser.add_argument("--apps-density", type=float, default=0.12)
+    parser.add_argument("--avad-density", type=float, default=0.02)
+    parser.add_argument("--tstv-density", type=float, default=0.6)
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument("--format", default="pretty")
+    parser.add_argument("--memory", action="store_true", help="track peak memory per stage with tracemalloc")
+    parser.add_argument("--compact", action="store_true", help="load the wide tables as compact rows")
+    parser.add_argument("--work-dir", help="keep the synthetic inputs here instead of a temp directory")
+    parser.add_argument("--report", default="bench_report.json")
+    args = parser.parse_args()
+
+    scales = [
+        {
+            "channels": channels,
+            "regions": regions,
+            "ott_per_channel": args.ott_per_channel,
+            "apps_density": args.apps_density,
+            "avad_density": args.avad_density,
+            "tstv_density": args.tstv_density,
+        }
+        for channels in args.channels for regions in args.regions
+    ]
+    report = run(scales, args.engines, memory=args.memory, output_format=args.format, work_dir=args.work_dir,
+                 compact=args.compact)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# Parsers for the encoded cells of the input sheets, and the table of
+# Channels.csv columns each channel field is parsed from. Both engines build
+# the channel fields from CHANNEL_FIELDS: the csv engine compiles it once per
+# build with compile_fields(), the pandas engine parses the distinct cells of
+# each column (see _parsed() there).
+#
+# Cells barely vary between channels (the same product lists and
+# auth-restriction strings repeat on most rows), so every distinct cell is
+# parsed once into a _Memo and the value is shared by all rows that have it.
+# List parsers therefore return tuples (written as JSON arrays all the same),
+# and each record gets its own copy of a parsed dict (see fresh()).
+
+
+def split_list(value):
+    # "a,b,c" -> ("a", "b", "c"), empty -> ()
+    return tuple(value.split(",")) if value else ()
+
+
+def optional_list(value):
+    # Like split_list, but None for an empty cell
+    return tuple(value.split(",")) if value else None
+
+
+def flag(value):
+    return value.lower() == "true" if value else False
+
+
+def optional_int(value):
+    return int(value) if value else None
+
+
+def url(value):
+    # Marks a URL field: compile_fields(rewrite=...) passes it through the
+    # deployment's URL rewriter (see urls.py), which caches on its own
+    return value
+
+
+def key_values(prefix):
+    # "LDVRChannelBasedAuthorization=True,LDVRRestrictCPEStreaming=False" ->
+    # {"channelBasedAuthorization": True, "restrictCPEStreaming": False} for
+    # prefix "LDVR"; True/False become booleans, other values stay text
+    def parse(value):
+        if not value:
+            return None
+        out = {}
+        for item in value.split(","):
+            key, _, setting = item.strip().partition("=")
+            key = key.removeprefix(prefix)
+            out[key[:1].lower() + key[1:]] = {"true": True, "false": False}.get(setting.lower(), setting)
+        return out
+    return parse
+
+
+def productization_refs(replay_rules, linear_products):
+    # ReplayProductizingRules "SR_IE_CASID_1" -> "replayProductizing-SR_IE_CASID_1"
+    # LinearProducts "crid://dtv.ie/lp/1" -> "linearProductizing-lp_1"
+    return (*(f"replayProductizing-{rule}" for rule in split_list(replay_rules)),
+            *("linearProductizing-" + "_".join(crid.rsplit("/", 2)[-2:]) for crid in split_list(linear_products)))
+
+
+# Output field: (column, or tuple of columns, parser); None copies the cell
+CHANNEL_FIELDS = {
+    "title": ("Name", None),
+    "description": ("Description", None),
+    "longDescription": ("LongDescription", None),
+    "type": ("Type", None),
+    "serviceGenreIds": ("ServiceGenre", split_list),
+    "replayable": ("Replayable", flag),
+    "startOver": ("StartOver", flag),
+    "catchUp": ("CatchUp", flag),
+    "ottFollow": ("OTTFollow", flag),
+    "casId": ("CasId", None),
+    "providerId": ("ProviderId", None),
+    "logo": ("FocusedLogo", url),
+    "poster": ("Poster", url),
+    "serviceGroups": ("ServiceGroup", split_list),
+    "productizationRefs": (("ReplayProductizingRules", "LinearProducts"), productization_refs),
+    "ldvrAuthRestrictions": ("LDVRAuthRestrictions", key_values("LDVR")),
+    "replaySources": ("ReplaySources", optional_list),
+}
+
+QAM_FIELDS = {
+    "frequency": ("Frequency", optional_int),
+    "symbolRate": ("SymbolRate", optional_int),
+    "modulation": ("Modulation", optional_int),
+    "fecInner": ("FecInner", optional_int),
+    "fecOuter": ("FecOuter", optional_int),
+    "programNumber": ("ProgramNbr", optional_int),
+    "ipLocationUrl": ("IPLocationURL", url),
+    "cpeType": ("CpeType", None),
+    "drmProtectionKey": ("DRMProtectionKey", None),
+    "streamingProtocol": ("StreamingProtocol", None),
+}
+
+OTT_FIELDS = {
+    "url": ("IPLocationURL", url),
+    "cpeType": ("CpeType", None),
+    "drmProtectionKey": ("DRMProtectionKey", None),
+    "streamingProtocol": ("StreamingProtocol", None),
+}
+
+
+def field_columns(fields):
+    # The input columns a field table reads, in order
+    columns = {}
+    for column, _ in fields.values():
+        columns.update(dict.fromkeys((column,) if isinstance(column, str) else column))
+    return tuple(columns)
+
+
+def fresh(value):
+    # A parsed value for one record: a shared dict is copied
+    return value.copy() if type(value) is dict else value
+
+
+class _Memo(dict):
+    # parse(cell), or parse(*cells) for a tuple of columns, per distinct key;
+    # hits are a plain dict lookup
+    def __init__(self, parse, multi):
+        super().__init__()
+        self.parse = parse
+        self.multi = multi
+
+    def __missing__(self, key):
+        value = self[key] = self.parse(*key) if self.multi else self.parse(key)
+        return value
+
+
+def compile_fields(fields, rewrite=None):
+    # Returns convert(record) -> {field: value} for row dicts (or Rows): a
+    # closure over the (name, column, memo) of every field, filling a copy
+    # of a dict with the fields already in output order. Each parser gets its
+    # own _Memo, so every distinct cell is parsed once; compile per build so
+    # the caches do not outlive the input. URL fields go through rewrite, if
+    # any.
+    template = dict.fromkeys(fields)
+    plain, rewritten, parsed = [], [], []
+    for name, (column, parse) in fields.items():
+        if parse is url and rewrite is not None:
+            rewritten.append((name, column))
+        elif parse is None or parse is url:
+            plain.append((name, column))
+        else:
+            parsed.append((name, column, _Memo(parse, not isinstance(column, str))))
+
+    def convert(record):
+        get = record.get
+        out = template.copy()
+        for name, column in plain:
+            out[name] = get(column)
+        for name, column in rewritten:
+            out[name] = rewrite(get(column))
+        for name, column, memo in parsed:
+            value = memo[get(column) if type(column) is str else tuple(map(get, column))]
+            # fresh(), inline
+            out[name] = value.copy() if type(value) is dict else value
+        return out
+    return convert
@@ -1,347 +1,288 @@
-import csv
-import json
-import os
+import sys
+from functools import partial
 
-def read_csv_to_dict_list(file_path, delimiter=';'):
-    data = []
-    try:
-        with open(file_path, "r", encoding="utf-8-sig") as f:
-            reader = csv.reader(f, delimiter=delimiter)
-            header = [h.strip() for h in next(reader)]
-            for row in reader:
-                if not row or not any(row):
-                    continue
-                row_data = {h: v for h, v in zip(header, row)}
-                data.append(row_data)
-    except FileNotFoundError:
-        print(f"Warning: File not found at {file_path}")
-    return data
-
-def read_channels(input_dir):
-    channels = {}
-    with open(f"{input_dir}/Channels.csv", "r", encoding="utf-8-sig") as f:
-        reader = csv.reader(f, delimiter=";")
-        header = [h.strip() for h in next(reader)]
-        for row in reader:
-            if not row or not any(row):
-                continue
-            channel_data = dict(zip(header, row))
-            if "ServiceId" in channel_data and channel_data["ServiceId"]:
-                channels[channel_data["ServiceId"]] = channel_data
-    return channels
-
-def read_service_genres(input_dir):
-    # This one has a special structure, so I'll keep its custom function for now.
-    service_genres = {"serviceGenre": [], "replayGenre": [], "genre": []}
-    with open(f"{input_dir}/ServiceGenre.csv", "r", encoding="utf-8-sig") as f:
-        reader = csv.reader(f, delimiter=";")
-        next(reader)  # Skip header
-        for row in reader:
-            if not row:
-                continue
-            genre_type = row[0]
-            if genre_type == "service":
-                service_genres["serviceGenre"].append(
-                    {
-                        "id": row[1],
-                        "name": row[2],
-                        "applications": [],
-                        "default": "false",
-                        "order": int(row[3]),
-                    }
-                )
-            elif genre_type == "replay":
-                service_genres["replayGenre"].append(
-                    {
-                        "id": row[1],
-                        "name": row[2],
-                        "order": int(row[3]),
-                    }
-                )
-            elif genre_type == "mapping":
-                genre = {
-                        "id": row[1],
-                        "name": row[2],
-                        "order": int(row[3]),
-                    }
-                if len(row) > 4 and row[4]:
-                    genre["parentId"] = row[4]
-                if len(row) > 5 and row[5]:
-                    genre["replayGenreId"] = row[5]
-                service_genres["genre"].append(genre)
-    return service_genres
-
-def read_channel_lineup(input_dir):
-    lineups_data = read_csv_to_dict_list(f"{input_dir}/Channel Lineup.csv")
-    lineups = {}
-    for row in lineups_data:
-        lineup_id = row.get("LineupID")
-        if lineup_id:
-            if lineup_id not in lineups:
-                lineups[lineup_id] = {
-                    "id": lineup_id,
-                    "name": row.get("LineupName"),
-                    "channels": [],
-                }
-            lineups[lineup_id]["channels"].append(
-                {"serviceId": row.get("ServiceID"), "channelNumber": int(row.get("ChannelNumber"))}
-            )
-    return list(lineups.values())
-
-def read_qam_locations(input_dir):
-    data = read_csv_to_dict_list(f"{input_dir}/QAM Channel Location.csv")
-    locations = {}
-    for row in data:
-        service_id = row.get("ServiceId")
-        if service_id:
-            if service_id not in locations:
-                locations[service_id] = []
-            locations[service_id].append(row)
-    return locations
-
-def read_ott_locations(input_dir):
-    data = read_csv_to_dict_list(f"{input_dir}/ottlocation.csv")
-    locations = {}
-    for row in data:
-        service_id = row.get("ServiceId")
-        if service_id:
-            if service_id not in locations:
-                locations[service_id] = []
-            locations[service_id].append(row)
-    return locations
-
-def read_linear_products(input_dir):
-    # This file has two header lines, so a custom reader is needed
-    products = []
-    with open(f"{input_dir}/Linear Products.csv", "r", encoding="utf-8-sig") as f:
-        reader = csv.reader(f, delimiter=";")
-        next(reader)  # Skip header
-        next(reader) # skip another header
-        for row in reader:
-            if row:
-                products.append({"id": row[0], "edsId": row[1]})
-    return products
-
-def read_replay_products(input_dir):
-    # This file has two header lines, so a custom reader is needed
-    products = []
-    with open(f"{input_dir}/Replay Products.csv", "r", encoding="utf-8-sig") as f:
-        reader = csv.reader(f, delimiter=";")
-        next(reader)  # Skip header
-        next(reader) # skip another header
-        for row in reader:
-            if row:
-                products.append({"id": row[0], "edsId": row[1]})
-    return products
-
-def read_apps(input_dir):
-    apps = {}
-    with open(f"{input_dir}/Apps.csv", "r", encoding="utf-8-sig") as f:
-        reader = csv.reader(f, delimiter=";")
-        header = next(reader)
-        for row in reader:
-            if not row or len(row) < 3:
-                continue
-            channel_id = row[0]
-            if channel_id not in apps:
-                apps[channel_id] = {}
-
-            apps[channel_id][row[1]] = row[2]
-    return apps
-
-def read_providers(input_dir):
-    return read_csv_to_dict_list(f"{input_dir}/providers.csv")
-
-def read_avad(input_dir):
-    avad = {}
-    with open(f"{input_dir}/AVAD.csv", "r", encoding="utf-8-sig") as f:
-        reader = csv.reader(f, delimiter=";")
-        header = next(reader)
-        for row in reader:
-            if not row or len(row) < 3:
-                continue
-            service_id = row[0]
-            if service_id not in avad:
-                avad[service_id] = {}
-
-            avad[service_id][row[1]] = row[2]
-    return avad
-
-def read_tstv(input_dir):
-    tstv = {}
-    with open(f"{input_dir}/TSTV.csv", "r", encoding="utf-8-sig") as f:
-        reader = csv.reader(f, delimiter=";")
-        header = next(reader)
-        for row in reader:
-            if not row or len(row) < 3:
-                continue
-            service_id = row[0]
-            if service_id not in tstv:
-                tstv[service_id] = {}
-
-            tstv[service_id][row[1]] = row[2]
-    return tstv
-
-def read_trickplaycontrol(input_dir):
-    trickplay = {}
-    with open(f"{input_dir}/Trickplaycontrol.csv", "r", encoding="utf-8-sig") as f:
-        reader = csv.reader(f, delimiter=";")
-        header = next(reader)
-        for row in reader:
-            if not row or len(row) < 3:
-                continue
-            service_id = row[0]
-            if service_id not in trickplay:
-                trickplay[service_id] = {}
-
-            trickplay[service_id][row[1]] = row[2]
-    return trickplay
-
-def read_city_mapping(input_dir):
-    city_mapping = {}
-    with open(f"{input_dir}/EDS City Mapping.csv", "r", encoding="utf-8-sig") as f:
-        reader = csv.reader(f, delimiter=";")
-        next(reader) # skip header
-        for row in reader:
-            if len(row) >= 2:
-                city_mapping[row[0]] = row[1]
-    return city_mapping
-
-def generate_json(input_dir, output_file):
-    channels_data = read_channels(input_dir)
-    service_genres_data = read_service_genres(input_dir)
-    lineups_data = read_channel_lineup(input_dir)
-    qam_locations_data = read_qam_locations(input_dir)
-    ott_locations_data = read_ott_locations(input_dir)
-    linear_products_data = read_linear_products(input_dir)
-    replay_products_data = read_replay_products(input_dir)
-    apps_data = read_apps(input_dir)
-    providers_data = read_providers(input_dir)
-    avad_data = read_avad(input_dir)
-    tstv_data = read_tstv(input_dir)
-    trickplaycontrol_data = read_trickplaycontrol(input_dir)
-    city_mapping_data = read_city_mapping(input_dir)
-
-    all_locations = []
-
-    final_json = {
+from converters import CHANNEL_FIELDS, OTT_FIELDS, QAM_FIELDS, compile_fields, split_list
+from integrity import build_index, load_index, warn_dangling
+from locations import LocationRegistry, location_id
+from section_cache import render_cached
+from tables import TABLES, load_table, load_tables
+from urls import load_rewriter, url_rewriter
+from validate import validated
+from writer import write_json
+
+DEFAULT_DEPLOYMENT = "IE_STARHUB"
+
+def read_channels(input_dir, snapshot_dir=None):
+    return load_table("channels", input_dir, snapshot_dir=snapshot_dir)
+
+def read_service_genres(input_dir, snapshot_dir=None):
+    return load_table("service_genres", input_dir, snapshot_dir=snapshot_dir)
+
+def read_channel_lineup(input_dir, snapshot_dir=None):
+    return load_table("channel_lineup", input_dir, snapshot_dir=snapshot_dir)
+
+def read_qam_locations(input_dir, memory_budget=None, snapshot_dir=None):
+    return load_table("qam_locations", input_dir, memory_budget=memory_budget, snapshot_dir=snapshot_dir)
+
+def read_ott_locations(input_dir, memory_budget=None, snapshot_dir=None):
+    return load_table("ott_locations", input_dir, memory_budget=memory_budget, snapshot_dir=snapshot_dir)
+
+def read_linear_products(input_dir, snapshot_dir=None):
+    return load_table("linear_products", input_dir, snapshot_dir=snapshot_dir)
+
+def read_replay_products(input_dir, snapshot_dir=None):
+    return load_table("replay_products", input_dir, snapshot_dir=snapshot_dir)
+
+def read_apps(input_dir, snapshot_dir=None):
+    return load_table("apps", input_dir, snapshot_dir=snapshot_dir)
+
+def read_providers(input_dir, snapshot_dir=None):
+    return load_table("providers", input_dir, snapshot_dir=snapshot_dir)
+
+def read_avad(input_dir, snapshot_dir=None):
+    return load_table("avad", input_dir, snapshot_dir=snapshot_dir)
+
+def read_tstv(input_dir, snapshot_dir=None):
+    return load_table("tstv", input_dir, snapshot_dir=snapshot_dir)
+
+def read_trickplaycontrol(input_dir, snapshot_dir=None):
+    return load_table("trickplaycontrol", input_dir, snapshot_dir=snapshot_dir)
+
+def read_city_mapping(input_dir, snapshot_dir=None):
+    return load_table("city_mapping", input_dir, snapshot_dir=snapshot_dir)
+
+READERS = {
+    "channels": read_channels,
+    "service_genres": read_service_genres,
+    "channel_lineup": read_channel_lineup,
+    "qam_locations": read_qam_locations,
+    "ott_locations": read_ott_locations,
+    "linear_products": read_linear_products,
+    "replay_products": read_replay_products,
+    "apps": read_apps,
+    "providers": read_providers,
+    "avad": read_avad,
+    "tstv": read_tstv,
+    "trickplaycontrol": read_trickplaycontrol,
+    "city_mapping": read_city_mapping,
+    "endpoints": load_rewriter,
+}
+
+# Opt-in: the wide per-row tables are loaded as tuple-backed rows
+COMPACT_READERS = {
+    **READERS,
+    **{name: partial(load_table, name, compact=True) for name in ("channels", "qam_locations", "ott_locations")},
+}
+
+def table_readers(compact=False, memory_budget=None, snapshot_dir=None):
+    # READERS (COMPACT_READERS) with the read options applied: memory_budget
+    # (bytes) reads the location tables in chunks of about that much parsed
+    # data, snapshot_dir keeps binary snapshots of the CSV tables there
+    readers = COMPACT_READERS if compact else READERS
+    if memory_budget:
+        readers = {
+            **readers,
+            "qam_locations": partial(read_qam_locations, memory_budget=memory_budget),
+            "ott_locations": partial(read_ott_locations, memory_budget=memory_budget),
+        }
+    if snapshot_dir:
+        readers = {
+            name: read if TABLES[name].mode == "ini" else partial(read, snapshot_dir=snapshot_dir)
+            for name, read in readers.items()
+        }
+    return readers
+
+def build_qam_location(loc, convert):
+    return {"type": "qam", **convert(loc)}
+
+def build_ott_location(loc, convert):
+    return {"type": "ott", **convert(loc)}
+
+def iter_channel_locations(data, channel_id, convert_qam, convert_ott):
+    # (location, region) pairs for one channel, QAM first
+    for loc in data["qam_locations"].get(channel_id, []):
+        yield build_qam_location(loc, convert_qam), loc.get("QAMRegion")
+    for loc in data["ott_locations"].get(channel_id, []):
+        yield build_ott_location(loc, convert_ott), None
+
+def build_application(app_info, rewrite):
+    return {
+        "id": app_info.get("deeplink"),
+        "trigger": app_info.get("trigger"),
+        "delay": int(app_info.get("delay", 0)),
+        "displayTime": int(app_info.get("displaytime", 0)),
+        "repeat": int(app_info.get("repeat", 0)),
+        "channelBound": split_list(app_info.get("channelbound")),
+        "logo": rewrite(app_info.get("applogo")),
+        "poster": rewrite(app_info.get("posterlogo")),
+        "synopsis": {
+            "en-IE": app_info.get("synopsis.en-IE")
+        } if app_info.get("synopsis.en-IE") else None,
+        "toasterMessage": {
+            "en-IE": app_info.get("toastermessage.en-IE")
+        } if app_info.get("toastermessage.en-IE") else None,
+    }
+
+def build_applications(data, channel_id, rewrite):
+    if channel_id in data["apps"]:
+        return [build_application(data["apps"][channel_id], rewrite)]
+    return []
+
+def build_channel_locations(data, channel_id, convert_qam, convert_ott):
+    return [
+        location_id(loc, region)
+        for loc, region in iter_channel_locations(data, channel_id, convert_qam, convert_ott)
+    ]
+
+def build_channel(data, channel_id, channel_info, locations, applications, convert):
+    return {
+        "id": channel_id,
+        **convert(channel_info),
+        "locations": locations,
+        "applications": applications,
+        "avad": data["avad"].get(channel_id, {}),
+        "tstv": data["tstv"].get(channel_id, {}),
+        "trickplay": data["trickplaycontrol"].get(channel_id, {})
+    }
+
+def build_location_ids(data):
+    # {channel id: [location id, ...]}, for building the channels up front
+    rewrite = url_rewriter(data)
+    convert_qam = compile_fields(QAM_FIELDS, rewrite)
+    convert_ott = compile_fields(OTT_FIELDS, rewrite)
+    return {
+        channel_id: build_channel_locations(data, channel_id, convert_qam, convert_ott)
+        for channel_id in data["channels"]
+    }
+
+def build_application_map(data):
+    # {channel id: [application]}, for building the channels up front
+    rewrite = url_rewriter(data)
+    return {channel_id: build_applications(data, channel_id, rewrite) for channel_id in data["channels"]}
+
+def iter_channels(data, locations=None, applications=None):
+    # locations and applications as built by build_location_ids() and
+    # build_application_map(), or None to build them channel by channel
+    rewrite = url_rewriter(data)
+    convert_channel = compile_fields(CHANNEL_FIELDS, rewrite)
+    convert_qam = compile_fields(QAM_FIELDS, rewrite)
+    convert_ott = compile_fields(OTT_FIELDS, rewrite)
+    for channel_id, channel_info in data["channels"].items():
+        if locations is None:
+            channel_locations = build_channel_locations(data, channel_id, convert_qam, convert_ott)
+        else:
+            channel_locations = locations[channel_id]
+        if applications is None:
+            channel_applications = build_applications(data, channel_id, rewrite)
+        else:
+            channel_applications = applications[channel_id]
+        yield build_channel(data, channel_id, channel_info, channel_locations, channel_applications,
+                            convert_channel)
+
+def build_location_map(data, stream=False):
+    # The same locations as iter_channels(), whose rewrites were counted
+    registry = LocationRegistry()
+    rewrite = url_rewriter(data).uncounted
+    convert_qam = compile_fields(QAM_FIELDS, rewrite)
+    convert_ott = compile_fields(OTT_FIELDS, rewrite)
+    for channel_id in data["channels"]:
+        for loc, region in iter_channel_locations(data, channel_id, convert_qam, convert_ott):
+            registry.add(loc, region)
+    return registry.stream_section() if stream else registry.section()
+
+def iter_lineups(data):
+    for group, entries in data["channel_lineup"].items():
+        yield {
+            "channelMapGroup": group,
+            "lineup": [
+                {"serviceId": service_id, "channelNumbers": [int(n) for n in cell.split(",")]}
+                for service_id, cell in entries
+            ],
+        }
+
+def _build(section, build, tables=None, count=None):
+    return build()
+
+def build_sections(data, stream=False, deployment_id=DEFAULT_DEPLOYMENT, metrics=None):
+    # metrics times each stage built up front (see metrics.Metrics.build)
+    url_rewriter(data).reset()
+    if stream:
+        channels = iter_channels(data)
+        lineups = iter_lineups(data)
+    else:
+        build = _build if metrics is None else metrics.build
+        locations = build("channels.locations", lambda: build_location_ids(data), ("qam_locations", "ott_locations"))
+        applications = build("channels.applications", lambda: build_application_map(data), ("apps",))
+        channels = build("channels", lambda: list(iter_channels(data, locations, applications)))
+        lineups = build("lineups", lambda: list(iter_lineups(data)))
+
+    return {
         "diagnostics": {
-            "source": "IE_STARHUB",
+            "source": deployment_id,
             "generationDate": "2025-08-01T09:00:00.000Z"
         },
-        "classifications": service_genres_data,
+        "classifications": data["service_genres"],
         "recommendationTopics": [],
         "deployment": {
-            "id": "IE_STARHUB",
+            "id": deployment_id,
             "deploymentDate": "2025-08-01T09:00:00.000Z"
         },
-        "cityIdMapping": city_mapping_data,
+        "cityIdMapping": data["city_mapping"],
         "productizing": {
-            "linear": linear_products_data,
-            "replay": replay_products_data
+            "linear": data["linear_products"],
+            "replay": data["replay_products"]
         },
-        "channels": [],
-        "lineups": lineups_data,
-        "locations": all_locations,
+        "channels": channels,
+        "lineups": lineups,
+        "locations": lambda: build_location_map(data, stream),
         "relatedMaterials": [],
         "applications": [],
-        "providers": providers_data
+        "providers": url_rewriter(data).rewrite_rows(data["providers"])
     }
 
-    # Populate channels
-    for channel_id, channel_info in channels_data.items():
-        # Locations
-        locations = []
-        if channel_id in qam_locations_data:
-            for loc in qam_locations_data[channel_id]:
-                location = {
-                    "type": "qam",
-                    "frequency": int(loc["Frequency"]) if loc.get("Frequency") else None,
-                    "symbolRate": int(loc["SymbolRate"]) if loc.get("SymbolRate") else None,
-                    "modulation": int(loc["Modulation"]) if loc.get("Modulation") else None,
-                    "fecInner": int(loc["FecInner"]) if loc.get("FecInner") else None,
-                    "fecOuter": int(loc["FecOuter"]) if loc.get("FecOuter") else None,
-                    "programNumber": int(loc["ProgramNbr"]) if loc.get("ProgramNbr") else None,
-                    "ipLocationUrl": loc.get("IPLocationURL"),
-                    "cpeType": loc.get("CpeType"),
-                    "drmProtectionKey": loc.get("DRMProtectionKey"),
-                    "streamingProtocol": loc.get("StreamingProtocol")
-                }
-                locations.append(location)
-                all_locations.append(location)
-
-        if channel_id in ott_locations_data:
-             for loc in ott_locations_data[channel_id]:
-                location = {
-                    "type": "ott",
-                    "url": loc.get("Url"),
-                    "cpeType": loc.get("CpeType"),
-                    "drmProtectionKey": loc.get("DRMProtectionKey"),
-                    "streamingProtocol": loc.get("StreamingProtocol")
-                }
-                locations.append(location)
-                all_locations.append(location)
-
-        # Applications
-        applications = []
-        if channel_id in apps_data:
-            app_info = apps_data[channel_id]
-            app = {
-                "id": app_info.get("deeplink"),
-                "trigger": app_info.get("trigger"),
-                "delay": int(app_info.get("delay", 0)),
-                "displayTime": int(app_info.get("displaytime", 0)),
-                "repeat": int(app_info.get("repeat", 0)),
-                "channelBound": app_info.get("channelbound").split(",") if app_info.get("channelbound") else [],
-                "logo": app_info.get("applogo"),
-                "poster": app_info.get("posterlogo"),
-                "synopsis": {
-                    "en-IE": app_info.get("synopsis.en-IE")
-                } if app_info.get("synopsis.en-IE") else None,
-                "toasterMessage": {
-                    "en-IE": app_info.get("toastermessage.en-IE")
-                } if app_info.get("toastermessage.en-IE") else None,
-            }
-            applications.append(app)
-
-        # AVAD
-        avad = avad_data.get(channel_id, {})
-
-        # TSTV
-        tstv = tstv_data.get(channel_id, {})
-
-        # Trickplay
-        trickplay = trickplaycontrol_data.get(channel_id, {})
-
-        final_json["channels"].append({
-            "id": channel_id,
-            "title": channel_info.get("Name"),
-            "description": channel_info.get("Description"),
-            "longDescription": channel_info.get("LongDescription"),
-            "type": channel_info.get("Type"),
-            "serviceGenreIds": channel_info.get("ServiceGenre", "").split(",") if channel_info.get("ServiceGenre") else [],
-            "replayable": channel_info.get("Replayable", "false").lower() == "true",
-            "startOver": channel_info.get("StartOver", "false").lower() == "true",
-            "catchUp": channel_info.get("CatchUp", "false").lower() == "true",
-            "ottFollow": channel_info.get("OTTFollow", "false").lower() == "true",
-            "casId": channel_info.get("CasId"),
-            "providerId": channel_info.get("ProviderId"),
-            "logo": channel_info.get("FocusedLogo"),
-            "poster": channel_info.get("Poster"),
-            "locations": locations,
-            "applications": applications,
-            "avad": avad,
-            "tstv": tstv,
-            "trickplay": trickplay
-        })
-
-    # Create output directory if it doesn't exist
-    output_dir = os.path.dirname(output_file)
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    with open(output_file, "w") as f:
-        json.dump(final_json, f, indent=4)
+def reference_tables(data):
+    # The loaded tables as integrity.build_index() reads them; channels carry
+    # the reference columns
+    return {**data, "channel_refs": data["channels"]}
+
+def generate_json(input_dir, output_file, workers=None, processes=False, stream=False, cache_dir=None,
+                  deployment_id=DEFAULT_DEPLOYMENT, output_format="pretty", compact=False, validate=False,
+                  metrics=None, memory_budget=None, snapshot_dir=None, check_references=False):
+    # validate=True checks each section as it is written, "thread" does the
+    # checking on a worker thread. metrics takes a metrics.Metrics to record
+    # per-stage timings in. memory_budget and snapshot_dir: see
+    # table_readers(). check_references warns about dangling references
+    # between the loaded tables (see integrity.py).
+    if metrics is not None:
+        metrics.start()
+    data = None
+    written = False
+    try:
+        readers = table_readers(compact, memory_budget, snapshot_dir)
+        if cache_dir:
+            engine = sys.modules[__name__]
+            sections = render_cached(engine, input_dir, cache_dir, workers=workers, processes=processes,
+                                     deployment_id=deployment_id, output_format=output_format, readers=readers)
+        else:
+            load = load_tables if metrics is None else metrics.load_tables
+            data = load(input_dir, readers, workers=workers, processes=processes)
+            sections = build_sections(data, stream=stream, deployment_id=deployment_id, metrics=metrics)
+        if check_references:
+            # The section cache only loads the tables of stale sections, so the
+            # index has its own read there
+            index = build_index(reference_tables(data)) if data is not None else load_index(input_dir, workers)
+            warn_dangling(index, input_dir)
+        if metrics is not None:
+            sections = metrics.sections(sections, data)
+        if validate:
+            sections = validated(sections, threaded=validate == "thread")
+        write_json(sections, output_file, output_format=output_format)
+        written = True
+    finally:
+        # Also after a failed run (e.g. a ValidationError), which leaves the
+        # previous output in place
+        if metrics is not None:
+            metrics.finish(output_file if written else None, url_rewriter(data).hits if data is not None else None)
 
 if __name__ == "__main__":
     generate_json("input_csv", "output/output.json")
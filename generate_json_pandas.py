@@ -1,332 +1,567 @@
-import pandas as pd
-import json
 import os
-import csv
+import sys
+from functools import partial
 
-def read_csv_to_dict_list(file_path, delimiter=';', header=0):
-    try:
-        df = pd.read_csv(file_path, sep=delimiter, encoding='utf-8-sig', header=header, dtype=str, skip_blank_lines=True)
-        df = df.where(pd.notna(df), None)
-        return df.to_dict(orient='records')
-    except FileNotFoundError:
-        print(f"Warning: File not found at {file_path}")
-        return []
-    except Exception as e:
-        print(f"Error reading {file_path}: {e}")
-        return []
-
-
-def read_channels(input_dir):
-    channels = {}
-    data = read_csv_to_dict_list(f"{input_dir}/Channels.csv")
-    print(f"Total rows in Channels.csv: {len(data)}")
-    for i, row in enumerate(data):
-        service_id = row.get("ServiceId")
-        if service_id:
-            channels[service_id] = row
-        else:
-            print(f"Skipping row {i+2} in Channels.csv due to missing ServiceId: {row}")
-    print(f"Total channels read: {len(channels)}")
-    return channels
-
-def read_service_genres(input_dir):
-    service_genres = {"serviceGenre": [], "replayGenre": [], "genre": []}
-    with open(f"{input_dir}/ServiceGenre.csv", "r", encoding="utf-8-sig") as f:
-        reader = csv.reader(f, delimiter=";")
-        header = next(reader)
-        rows = list(reader)
-
-        genre_names = {}
-        for row in rows:
-            if len(row) >= 5:
-                term_id, genre_type, _, _, name = row
-                if genre_type in ["service", "replay"]:
-                    genre_names[term_id] = name
-
-        for row in rows:
-            if not row or len(row) < 2:
+import numpy as np
+import pandas as pd
+
+import snapshot
+
+from converters import CHANNEL_FIELDS, OTT_FIELDS, QAM_FIELDS, _Memo, fresh, optional_int, url
+from integrity import build_index, load_index, warn_dangling
+from locations import LocationRegistry, location_id
+from section_cache import render_cached
+from tables import (NA_VALUES, REFERENCE_COLUMNS, TABLES, chunk_rows, file_digest, load_table, load_tables,
+                    projected_columns, table_path)
+from urls import load_rewriter, url_rewriter
+from validate import validated
+from writer import write_json
+
+DEFAULT_DEPLOYMENT = "IE_STARHUB"
+
+def iter_frame_rows(path, spec):
+    # spec.chunk_size rows at a time, when the table is read under a memory
+    # budget (see tables.load_table)
+    if not spec.chunk_size:
+        df = pd.read_csv(path, sep=spec.delimiter, encoding='utf-8-sig', header=None, dtype=str,
+                         keep_default_na=False, skip_blank_lines=True)
+        return df.values.tolist()
+    return (row for chunk in pd.read_csv(path, sep=spec.delimiter, encoding='utf-8-sig', header=None, dtype=str,
+                                         keep_default_na=False, skip_blank_lines=True, chunksize=spec.chunk_size)
+            for row in chunk.values.tolist())
+
+
+def read_table(name, input_dir, snapshot_dir=None):
+    return load_table(name, input_dir, reader=iter_frame_rows, snapshot_dir=snapshot_dir)
+
+
+def _read_csv_frame(path, spec, wanted):
+    return pd.read_csv(path, sep=spec.delimiter, encoding='utf-8-sig', header=spec.header_rows - 1, dtype=str,
+                       keep_default_na=False, skip_blank_lines=True,
+                       usecols=None if wanted is None else lambda name: name.strip() in wanted)
+
+
+def _snapshot_series(snap, i):
+    # Built from the mapped blocks: codes and ints are read without a copy,
+    # only the distinct values of a column become python strings, and the
+    # column is a plain object array of them (no per-cell validation)
+    if snap.is_int(i):
+        numbers, codes = np.unique(np.frombuffer(snap.ints(i), dtype=np.int64), return_inverse=True)
+        text = {snapshot.MISSING: None, snapshot.EMPTY: ""}
+        pool = np.array([text.get(number, str(number)) for number in numbers.tolist()], dtype=object)
+    else:
+        pool = np.array([None, *snap.pool(i)], dtype=object)
+        codes = np.frombuffer(snap.codes(i), dtype=np.uint32)
+    return pd.Series(pool[codes], dtype=object)
+
+
+def _snapshot_target(path, spec, wanted, snapshot_dir):
+    variant = f"frame:{spec.delimiter}:{spec.header_rows}:{sorted(wanted) if wanted is not None else '*'}"
+    return snapshot.snapshot_file(snapshot_dir, file_digest(path), variant)
+
+
+def _snapshot_frame(path, spec, wanted, snapshot_dir):
+    target = _snapshot_target(path, spec, wanted, snapshot_dir)
+    if os.path.exists(target):
+        snap = snapshot.Snapshot(target)
+        return pd.DataFrame({name: _snapshot_series(snap, i) for i, name in enumerate(snap.names)},
+                            index=pd.RangeIndex(snap.rows))
+    df = _read_csv_frame(path, spec, wanted)
+    snapshot.write_snapshot(target, list(df.columns), [_tolist(df[col]) for col in df.columns], rows=len(df))
+    return df
+
+
+def _snapshot_categorical(snap, i):
+    # The mapped codes become the categorical codes directly; no cell is
+    # turned into a python string
+    if snap.is_int(i):
+        numbers, codes = np.unique(np.frombuffer(snap.ints(i), dtype=np.int64), return_inverse=True)
+        text = {snapshot.MISSING: None, snapshot.EMPTY: ""}
+        values = [text.get(number, str(number)) for number in numbers.tolist()]
+        categories = [value for value in values if value is not None]
+        positions = np.array([-1 if value is None else categories.index(value) for value in values], dtype=np.int32)
+        return pd.Categorical.from_codes(positions[codes], categories=categories)
+    codes = np.frombuffer(snap.codes(i), dtype=np.uint32).astype(np.int32) - 1
+    return pd.Categorical.from_codes(codes, categories=snap.pool(i))
+
+
+def _read_chunked_frame(path, spec, wanted, memory_budget, snapshot_dir=None):
+    # The file is read in chunks of about memory_budget bytes of raw strings.
+    # Columns that are low-cardinality in the first chunk (as in read_frame's
+    # compact rule) become categoricals: each chunk is factorized against
+    # the distinct values read so far and only its codes are kept. The other
+    # columns keep their strings, which no categorical would save.
+    if snapshot_dir:
+        target = _snapshot_target(path, spec, wanted, snapshot_dir)
+        if os.path.exists(target):
+            snap = snapshot.Snapshot(target)
+            return pd.DataFrame({name: _snapshot_categorical(snap, i) for i, name in enumerate(snap.names)},
+                                index=pd.RangeIndex(snap.rows))
+    distinct, parts = None, {}
+    for chunk in pd.read_csv(path, sep=spec.delimiter, encoding='utf-8-sig', header=spec.header_rows - 1,
+                             dtype=str, keep_default_na=False, skip_blank_lines=True,
+                             usecols=None if wanted is None else lambda name: name.strip() in wanted,
+                             chunksize=chunk_rows(path, spec, memory_budget)):
+        if distinct is None:
+            distinct = {col: {} for col in chunk.columns if chunk[col].nunique() <= len(chunk) // 2}
+        for col in chunk.columns:
+            if col not in distinct:
+                parts.setdefault(col, []).append(chunk[col])
                 continue
+            codes, values = pd.factorize(chunk[col])
+            seen = distinct[col]
+            # A missing cell (short row) has code -1 in the chunk and in the
+            # column
+            known = np.array([*(seen.setdefault(value, len(seen)) for value in values.tolist()), -1], dtype=np.int32)
+            parts.setdefault(col, []).append(known[codes])
+    if distinct is None:
+        return _read_csv_frame(path, spec, wanted)
+    frame = {}
+    for col, chunks in parts.items():
+        if col in distinct:
+            frame[col] = pd.Categorical.from_codes(np.concatenate(chunks), categories=list(distinct.pop(col)))
+        else:
+            frame[col] = pd.concat(chunks, ignore_index=True)
+        chunks.clear()
+    return pd.DataFrame(frame)
+
+
+def read_frame(name, input_dir, compact=False, memory_budget=None, snapshot_dir=None):
+    spec = TABLES[name]
+    path = table_path(input_dir, spec)
+    if spec.optional and not os.path.exists(path):
+        print(f"Warning: File not found at {path}")
+        return pd.DataFrame()
+    wanted = projected_columns(spec)
+    if memory_budget:
+        df = _read_chunked_frame(path, spec, wanted, memory_budget, snapshot_dir)
+    elif snapshot_dir:
+        df = _snapshot_frame(path, spec, wanted, snapshot_dir)
+    else:
+        df = _read_csv_frame(path, spec, wanted)
+    df.columns = df.columns.str.strip()
+    df = df[(df != "").any(axis=1)]
+    for col, fn in (spec.converters or {}).items():
+        col = df.columns[col] if isinstance(col, int) else col
+        if col in df:
+            df[col] = df[col].map(fn)
+    if compact:
+        # Low-cardinality columns (CpeType, StreamingProtocol, QAMRegion, ...)
+        # become categoricals: one copy of each distinct value per table
+        for col in df.columns:
+            if df[col].nunique() <= len(df) // 2:
+                df[col] = df[col].astype("category")
+    return df.reset_index(drop=True)
+
+
+def read_channels(input_dir, compact=False, snapshot_dir=None):
+    return read_frame("channels", input_dir, compact=compact, snapshot_dir=snapshot_dir)
+
+def read_service_genres(input_dir, snapshot_dir=None):
+    return read_table("service_genres", input_dir, snapshot_dir=snapshot_dir)
+
+def read_channel_lineup(input_dir, snapshot_dir=None):
+    # Wide ServiceID x channel map group matrix, unpivoted in one melt into
+    # (channelMapGroup, ServiceID, channelNumbers) rows in group-major order
+    spec = TABLES["channel_lineup"]
+    wide = read_frame("channel_lineup", input_dir, snapshot_dir=snapshot_dir)
+    if spec.key not in wide:
+        return pd.DataFrame({"channelMapGroup": pd.Categorical([]), spec.key: [], "channelNumbers": []})
+    wide = wide[wide[spec.key] != ""].drop(columns=[c for c in spec.value if c in wide])
+    long = wide.melt(id_vars=spec.key, var_name="channelMapGroup", value_name="cell")
+    long = long[~long["cell"].isin(NA_VALUES)]
+    # Categorical so that a group with no channels still gets a lineup
+    long["channelMapGroup"] = pd.Categorical(long["channelMapGroup"], categories=wide.columns.drop(spec.key))
+    long["channelNumbers"] = [
+        list(map(int, cell.split(","))) if "," in cell else [int(cell)] for cell in long["cell"].tolist()
+    ]
+    return long[["channelMapGroup", spec.key, "channelNumbers"]].reset_index(drop=True)
+
+def read_qam_locations(input_dir, memory_budget=None, snapshot_dir=None):
+    return read_frame("qam_locations", input_dir, memory_budget=memory_budget, snapshot_dir=snapshot_dir)
+
+def read_ott_locations(input_dir, memory_budget=None, snapshot_dir=None):
+    return read_frame("ott_locations", input_dir, memory_budget=memory_budget, snapshot_dir=snapshot_dir)
+
+def read_linear_products(input_dir, snapshot_dir=None):
+    return read_table("linear_products", input_dir, snapshot_dir=snapshot_dir)
+
+def read_replay_products(input_dir, snapshot_dir=None):
+    return read_table("replay_products", input_dir, snapshot_dir=snapshot_dir)
+
+def read_apps(input_dir, snapshot_dir=None):
+    return read_frame("apps", input_dir, snapshot_dir=snapshot_dir)
+
+def read_providers(input_dir, snapshot_dir=None):
+    return read_table("providers", input_dir, snapshot_dir=snapshot_dir)
+
+def read_avad(input_dir, snapshot_dir=None):
+    return read_frame("avad", input_dir, snapshot_dir=snapshot_dir)
+
+def read_tstv(input_dir, snapshot_dir=None):
+    return read_frame("tstv", input_dir, snapshot_dir=snapshot_dir)
+
+def read_trickplaycontrol(input_dir, snapshot_dir=None):
+    return read_frame("trickplaycontrol", input_dir, snapshot_dir=snapshot_dir)
+
+def read_city_mapping(input_dir, snapshot_dir=None):
+    return read_table("city_mapping", input_dir, snapshot_dir=snapshot_dir)
+
+READERS = {
+    "channels": read_channels,
+    "service_genres": read_service_genres,
+    "channel_lineup": read_channel_lineup,
+    "qam_locations": read_qam_locations,
+    "ott_locations": read_ott_locations,
+    "linear_products": read_linear_products,
+    "replay_products": read_replay_products,
+    "apps": read_apps,
+    "providers": read_providers,
+    "avad": read_avad,
+    "tstv": read_tstv,
+    "trickplaycontrol": read_trickplaycontrol,
+    "city_mapping": read_city_mapping,
+    "endpoints": load_rewriter,
+}
+
+# Opt-in: the wide per-row tables are loaded with categorical columns
+COMPACT_READERS = {
+    **READERS,
+    "channels": partial(read_channels, compact=True),
+    "qam_locations": partial(read_frame, "qam_locations", compact=True),
+    "ott_locations": partial(read_frame, "ott_locations", compact=True),
+}
+
+def table_readers(compact=False, memory_budget=None, snapshot_dir=None):
+    # READERS (COMPACT_READERS) with the read options applied: memory_budget
+    # (bytes) reads the location tables in chunks of about that much parsed
+    # data, snapshot_dir keeps binary snapshots of the CSV tables there
+    readers = COMPACT_READERS if compact else READERS
+    if memory_budget:
+        readers = {
+            **readers,
+            "qam_locations": partial(read_qam_locations, memory_budget=memory_budget),
+            "ott_locations": partial(read_ott_locations, memory_budget=memory_budget),
+        }
+    if snapshot_dir:
+        readers = {
+            name: read if TABLES[name].mode == "ini" else partial(read, snapshot_dir=snapshot_dir)
+            for name, read in readers.items()
+        }
+    return readers
+
+# Channel assembly is columnar: every input below is a DataFrame, all
+# per-field conversions are done on whole columns, and the per-ServiceId
+# joins are groupby/merge operations. Python dicts are only built row by row
+# while the document is being written.
+
+def _text(df, col):
+    if col in df:
+        return df[col]
+    return pd.Series(None, index=df.index, dtype=object)
+
+
+def _int(df, col):
+    # int(value) if value else None, for a whole column
+    if col not in df:
+        return _text(df, col)
+    values = pd.to_numeric(df[col].where(df[col] != "")).astype("Int64")
+    return values.astype(object).where(values.notna(), None)
+
+
+def _count(df, col):
+    # int(value) with a default of 0 for a missing value
+    if col not in df:
+        return pd.Series(0, index=df.index, dtype="Int64")
+    return pd.to_numeric(df[col].fillna(0)).astype("Int64")
+
+
+def _split(df, col):
+    # value.split(",") if value else [] -- empty values stay NaN here and are
+    # turned into [] when the row is materialized
+    return _text(df, col).where(_text(df, col) != "").str.split(",")
+
+
+def _parsed(df, column, parse, rewrite=None):
+    # parse(cell), or parse(*cells) for a tuple of columns, for a whole
+    # column: the distinct cells (or cell tuples) are factorized and only
+    # those go through the parser's _Memo; rows then take their value by
+    # code, each with its own copy of a parsed dict (see converters.fresh).
+    # URL columns go through rewrite cell by cell, so that its hits are
+    # counted.
+    if parse is url and rewrite is not None:
+        return pd.Series([rewrite(value) for value in _tolist(_text(df, column))], index=df.index, dtype=object)
+    if parse is None or parse is url:
+        return _text(df, column)
+    multi = not isinstance(column, str)
+    keys = pd.Series(list(zip(*(_tolist(_text(df, col)) for col in column))), dtype=object) if multi \
+        else _text(df, column)
+    codes, distinct = pd.factorize(keys, use_na_sentinel=False)
+    memo = _Memo(parse, multi)
+    parsed = [memo[key] for key in _tolist(pd.Series(distinct, dtype=object))]
+    values = list(map(parsed.__getitem__, codes.tolist()))
+    if any(type(value) is dict for value in parsed):
+        values = [fresh(value) for value in values]
+    return pd.Series(values, index=df.index, dtype=object)
+
+
+def _with_service_ids(df, key="ServiceId"):
+    if key not in df:
+        return df.iloc[0:0].assign(**{key: pd.Series(dtype=object)})
+    return df[df[key] != ""]
+
+
+def build_location_frames(data, rewrite=None):
+    if rewrite is None:
+        rewrite = url_rewriter(data)
+    qam = _with_service_ids(data["qam_locations"])
+    qam = pd.DataFrame({
+        "ServiceId": qam["ServiceId"],
+        "region": _text(qam, "QAMRegion"),
+        "type": "qam",
+        # The integer columns are converted vectorized rather than per value
+        **{name: _int(qam, col) if parse is optional_int else _parsed(qam, col, parse, rewrite)
+           for name, (col, parse) in QAM_FIELDS.items()},
+    })
+    ott = _with_service_ids(data["ott_locations"])
+    ott = pd.DataFrame({
+        "ServiceId": ott["ServiceId"],
+        "region": None,
+        "type": "ott",
+        **{name: _parsed(ott, col, parse, rewrite) for name, (col, parse) in OTT_FIELDS.items()},
+    })
+    return [_grouped(qam), _grouped(ott)]
+
+
+def _tolist(series):
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def _grouped(frame):
+    # (row positions per ServiceId, output columns as python lists, region
+    # and location id per row); the id is hashed once per distinct location
+    positions = frame.groupby("ServiceId", sort=False).indices if len(frame) else {}
+    columns = {name: _tolist(frame[name]) for name in frame.columns if name not in ("ServiceId", "region")}
+    regions = _tolist(frame["region"])
+    keys = pd.Series(list(zip(regions, *columns.values())), dtype=object)
+    codes, distinct = pd.factorize(keys, use_na_sentinel=False)
+    distinct_ids = [location_id(dict(zip(columns, values)), region) for region, *values in distinct]
+    ids = list(map(distinct_ids.__getitem__, codes.tolist()))
+    return positions, columns, regions, ids
+
+
+def _record(columns, i):
+    return {name: values[i] for name, values in columns.items()}
+
+
+def build_application_frame(apps, rewrite):
+    if apps.shape[1] < 3:
+        return pd.DataFrame()
+    key, call, value = apps.columns[:3]
+    wide = apps.drop_duplicates([key, call], keep="last").pivot(index=key, columns=call, values=value)
+    wide = wide.astype(object).where(wide.notna(), None)
+    return pd.DataFrame({
+        "id": _text(wide, "deeplink"),
+        "trigger": _text(wide, "trigger"),
+        "delay": _count(wide, "delay"),
+        "displayTime": _count(wide, "displaytime"),
+        "repeat": _count(wide, "repeat"),
+        "channelBound": _split(wide, "channelbound"),
+        "logo": _parsed(wide, "applogo", url, rewrite),
+        "poster": _parsed(wide, "posterlogo", url, rewrite),
+        "synopsis": _text(wide, "synopsis.en-IE"),
+        "toasterMessage": _text(wide, "toastermessage.en-IE"),
+    }, index=wide.index)
+
+
+def build_kv_map(frame):
+    if frame.shape[1] < 3:
+        return {}
+    key, name, value = frame.columns[:3]
+    return {
+        service_id: dict(zip(group[name], group[value]))
+        for service_id, group in frame.groupby(key, sort=False)
+    }
 
-            term_id = row[0]
-            genre_type = row[1]
-
-            if genre_type == "service":
-                order = row[2]
-                name = row[4]
-                service_genres["serviceGenre"].append({
-                    "id": term_id,
-                    "name": name,
-                    "applications": [],
-                    "default": "false",
-                    "order": int(order) if order else 0,
-                })
-            elif genre_type == "replay":
-                order = row[2]
-                name = row[4]
-                service_genres["replayGenre"].append({
-                    "id": term_id,
-                    "name": name,
-                    "order": int(order) if order else 0,
-                })
-            elif genre_type == "mapping":
-                order = row[2]
-                parent_id = row[3] if len(row) > 3 else None
-                replay_genre_id = row[4] if len(row) > 4 else None
-
-                name = genre_names.get(term_id)
-
-                genre = {
-                    "id": term_id,
-                    "name": name,
-                    "order": int(order) if order else 0,
-                    "parentId": parent_id if parent_id else None,
-                    "replayGenreId": replay_genre_id if replay_genre_id else None,
-                }
-                service_genres["genre"].append(genre)
-
-    return service_genres
-
-def read_channel_lineup(input_dir):
-    lineups_data = read_csv_to_dict_list(f"{input_dir}/Channel Lineup.csv")
-    lineups = {}
-    for row in lineups_data:
-        lineup_id = row.get("LineupID")
-        if lineup_id:
-            if lineup_id not in lineups:
-                lineups[lineup_id] = {
-                    "id": lineup_id,
-                    "name": row.get("LineupName"),
-                    "channels": [],
-                }
-            lineups[lineup_id]["channels"].append(
-                {"serviceId": row.get("ServiceID"), "channelNumber": int(row.get("ChannelNumber"))}
-            )
-    return list(lineups.values())
-
-def read_qam_locations(input_dir):
-    data = read_csv_to_dict_list(f"{input_dir}/QAM Channel Location.csv")
-    locations = {}
-    for row in data:
-        service_id = row.get("ServiceId")
-        if service_id:
-            if service_id not in locations:
-                locations[service_id] = []
-            locations[service_id].append(row)
-    return locations
-
-def read_ott_locations(input_dir):
-    data = read_csv_to_dict_list(f"{input_dir}/ottlocation.csv")
-    locations = {}
-    for row in data:
-        service_id = row.get("ServiceId")
-        if service_id:
-            if service_id not in locations:
-                locations[service_id] = []
-            locations[service_id].append(row)
-    return locations
-
-def read_linear_products(input_dir):
-    df = pd.read_csv(f"{input_dir}/Linear Products.csv", sep=';', encoding='utf-8-sig', header=1, dtype=str)
-    df.columns = ['ProductId', 'EDSProductId', 'Price', 'Duration', 'Description']
-    df = df.where(pd.notna(df), None)
-    return df[['ProductId', 'EDSProductId']].rename(columns={'ProductId': 'id', 'EDSProductId': 'edsId'}).to_dict('records')
-
-def read_replay_products(input_dir):
-    df = pd.read_csv(f"{input_dir}/Replay Products.csv", sep=';', encoding='utf-8-sig', header=1, dtype=str)
-    df.columns = ['ProductID', 'EDSProductID']
-    df = df.where(pd.notna(df), None)
-    return df.rename(columns={'ProductID': 'id', 'EDSProductID': 'edsId'}).to_dict('records')
-
-
-def read_apps(input_dir):
-    apps = {}
-    data = read_csv_to_dict_list(f"{input_dir}/Apps.csv")
-    for row in data:
-        channel_id = row.get("Channel")
-        if channel_id:
-            if channel_id not in apps:
-                apps[channel_id] = {}
-            apps[channel_id][row['Call']] = row['Definition']
-    return apps
-
-def read_providers(input_dir):
-    return read_csv_to_dict_list(f"{input_dir}/providers.csv")
-
-def read_avad(input_dir):
-    avad = {}
-    data = read_csv_to_dict_list(f"{input_dir}/AVAD.csv")
-    for row in data:
-        service_id = row.get("serviceid")
-        if service_id:
-            if service_id not in avad:
-                avad[service_id] = {}
-            avad[service_id][row['key']] = row['value']
-    return avad
-
-def read_tstv(input_dir):
-    tstv = {}
-    data = read_csv_to_dict_list(f"{input_dir}/TSTV.csv")
-    for row in data:
-        service_id = row.get("serviceid")
-        if service_id:
-            if service_id not in tstv:
-                tstv[service_id] = {}
-            tstv[service_id][row['key']] = row['value']
-    return tstv
-
-def read_trickplaycontrol(input_dir):
-    trickplay = {}
-    data = read_csv_to_dict_list(f"{input_dir}/Trickplaycontrol.csv")
-    for row in data:
-        service_id = row.get("serviceid")
-        if service_id:
-            if service_id not in trickplay:
-                trickplay[service_id] = {}
-            trickplay[service_id][row['key']] = row['value']
-    return trickplay
-
-def read_city_mapping(input_dir):
-    city_mapping = {}
-    data = read_csv_to_dict_list(f"{input_dir}/EDS City Mapping.csv")
-    for row in data:
-        city_mapping[row['cityId']] = row['CMG']
-    return city_mapping
-
-def generate_json(input_dir, output_file):
-    channels_data = read_channels(input_dir)
-    service_genres_data = read_service_genres(input_dir)
-    lineups_data = read_channel_lineup(input_dir)
-    qam_locations_data = read_qam_locations(input_dir)
-    ott_locations_data = read_ott_locations(input_dir)
-    linear_products_data = read_linear_products(input_dir)
-    replay_products_data = read_replay_products(input_dir)
-    apps_data = read_apps(input_dir)
-    providers_data = read_providers(input_dir)
-    avad_data = read_avad(input_dir)
-    tstv_data = read_tstv(input_dir)
-    trickplaycontrol_data = read_trickplaycontrol(input_dir)
-    city_mapping_data = read_city_mapping(input_dir)
-
-    all_locations = []
-
-    final_json = {
+
+def build_channel_frame(data, rewrite=None):
+    channels = _with_service_ids(data["channels"])
+    order = channels["ServiceId"].drop_duplicates()
+    channels = channels.drop_duplicates("ServiceId", keep="last").set_index("ServiceId").reindex(order)
+    return pd.DataFrame({
+        "id": channels.index,
+        **{name: _parsed(channels, column, parse, rewrite) for name, (column, parse) in CHANNEL_FIELDS.items()},
+    }, index=channels.index)
+
+
+def iter_channels(data, locations=None, apps=None, channels=None):
+    # locations, apps and channels as built by build_location_frames(),
+    # build_application_frame() and build_channel_frame(), or None to build
+    # them here
+    if locations is None:
+        locations = build_location_frames(data)
+    rewrite = url_rewriter(data)
+    if channels is None:
+        channels = build_channel_frame(data, rewrite)
+    if apps is None:
+        apps = build_application_frame(data["apps"], rewrite)
+    has_app = channels.index.isin(apps.index)
+    apps = apps.reindex(channels.index)
+    kv_maps = [build_kv_map(data[name]) for name in ("avad", "tstv", "trickplaycontrol")]
+
+    channel_columns = {name: _tolist(channels[name]) for name in channels.columns}
+    app_columns = {name: _tolist(apps[name]) for name in apps.columns}
+    for i, channel_id in enumerate(channel_columns["id"]):
+        channel = {name: values[i] for name, values in channel_columns.items()}
+        channel["locations"] = [
+            ids[j] for positions, _, _, ids in locations for j in positions.get(channel_id, ())
+        ]
+        channel["applications"] = [_application(app_columns, i)] if has_app[i] else []
+        channel["avad"], channel["tstv"], channel["trickplay"] = (m.get(channel_id, {}) for m in kv_maps)
+        yield channel
+
+
+def _application(app_columns, i):
+    app = {name: values[i] for name, values in app_columns.items()}
+    if not isinstance(app["channelBound"], list):
+        app["channelBound"] = []
+    app["synopsis"] = {"en-IE": app["synopsis"]} if app["synopsis"] else None
+    app["toasterMessage"] = {"en-IE": app["toasterMessage"]} if app["toasterMessage"] else None
+    return app
+
+
+def build_location_map(data, locations=None, channel_ids=None, stream=False):
+    # Rebuilt frames repeat rewrites that iter_channels() already counted.
+    # channel_ids: the "id" column of build_channel_frame(), in output order
+    if locations is None:
+        locations = build_location_frames(data, url_rewriter(data).uncounted)
+    if channel_ids is None:
+        channel_ids = _with_service_ids(data["channels"])["ServiceId"].drop_duplicates()
+    registry = LocationRegistry()
+    for channel_id in channel_ids:
+        for positions, columns, regions, ids in locations:
+            for j in positions.get(channel_id, ()):
+                registry.add(_record(columns, j), regions[j], ids[j])
+    return registry.stream_section() if stream else registry.section()
+
+def iter_lineups(data):
+    lineups = data["channel_lineup"]
+    service_ids = lineups[TABLES["channel_lineup"].key].tolist()
+    numbers = lineups["channelNumbers"].tolist()
+    indices = lineups.groupby("channelMapGroup", sort=False, observed=True).indices
+    for group in lineups["channelMapGroup"].cat.categories:
+        yield {
+            "channelMapGroup": group,
+            "lineup": [{"serviceId": service_ids[i], "channelNumbers": numbers[i]} for i in indices.get(group, ())],
+        }
+
+def _build(section, build, tables=None, count=None):
+    return build()
+
+def build_sections(data, stream=False, deployment_id=DEFAULT_DEPLOYMENT, metrics=None):
+    # metrics times each stage built up front (see metrics.Metrics.build)
+    url_rewriter(data).reset()
+    if stream:
+        channels = iter_channels(data)
+        location_map = lambda: build_location_map(data, stream=True)
+        lineups = iter_lineups(data)
+    else:
+        build = _build if metrics is None else metrics.build
+        locations = build("channels.locations", lambda: build_location_frames(data),
+                          ("qam_locations", "ott_locations"), lambda frames: sum(len(ids) for *_, ids in frames))
+        apps = build("channels.applications", lambda: build_application_frame(data["apps"], url_rewriter(data)),
+                     ("apps",))
+        fields = build("channels.fields", lambda: build_channel_frame(data, url_rewriter(data)), ("channels",))
+        channels = build("channels", lambda: list(iter_channels(data, locations, apps, fields)))
+        location_map = build("locations", lambda: build_location_map(data, locations, fields["id"]))
+        lineups = build("lineups", lambda: list(iter_lineups(data)))
+
+    return {
         "diagnostics": {
-            "source": "IE_STARHUB",
+            "source": deployment_id,
             "generationDate": "2025-08-01T09:00:00.000Z"
         },
-        "classifications": service_genres_data,
+        "classifications": data["service_genres"],
         "recommendationTopics": [],
         "deployment": {
-            "id": "IE_STARHUB",
+            "id": deployment_id,
             "deploymentDate": "2025-08-01T09:00:00.000Z"
         },
-        "cityIdMapping": city_mapping_data,
+        "cityIdMapping": data["city_mapping"],
         "productizing": {
-            "linear": linear_products_data,
-            "replay": replay_products_data
+            "linear": data["linear_products"],
+            "replay": data["replay_products"]
         },
-        "channels": [],
-        "lineups": lineups_data,
-        "locations": all_locations,
+        "channels": channels,
+        "lineups": lineups,
+        "locations": location_map,
         "relatedMaterials": [],
         "applications": [],
-        "providers": providers_data
+        "providers": url_rewriter(data).rewrite_rows(data["providers"])
     }
 
-    # Populate channels
-    for channel_id, channel_info in channels_data.items():
-        # Locations
-        locations = []
-        if channel_id in qam_locations_data:
-            for loc in qam_locations_data[channel_id]:
-                location = {
-                    "type": "qam",
-                    "frequency": int(loc["Frequency"]) if loc.get("Frequency") else None,
-                    "symbolRate": int(loc["SymbolRate"]) if loc.get("SymbolRate") else None,
-                    "modulation": int(loc["Modulation"]) if loc.get("Modulation") else None,
-                    "fecInner": int(loc["FecInner"]) if loc.get("FecInner") else None,
-                    "fecOuter": int(loc["FecOuter"]) if loc.get("FecOuter") else None,
-                    "programNumber": int(loc["ProgramNbr"]) if loc.get("ProgramNbr") else None,
-                    "ipLocationUrl": loc.get("IPLocationURL"),
-                    "cpeType": loc.get("CpeType"),
-                    "drmProtectionKey": loc.get("DRMProtectionKey"),
-                    "streamingProtocol": loc.get("StreamingProtocol")
-                }
-                locations.append(location)
-                all_locations.append(location)
-
-        if channel_id in ott_locations_data:
-             for loc in ott_locations_data[channel_id]:
-                location = {
-                    "type": "ott",
-                    "url": loc.get("Url"),
-                    "cpeType": loc.get("CpeType"),
-                    "drmProtectionKey": loc.get("DRMProtectionKey"),
-                    "streamingProtocol": loc.get("StreamingProtocol")
-                }
-                locations.append(location)
-                all_locations.append(location)
-
-        # Applications
-        applications = []
-        if channel_id in apps_data:
-            app_info = apps_data[channel_id]
-            app = {
-                "id": app_info.get("deeplink"),
-                "trigger": app_info.get("trigger"),
-                "delay": int(app_info.get("delay", 0)),
-                "displayTime": int(app_info.get("displaytime", 0)),
-                "repeat": int(app_info.get("repeat", 0)),
-                "channelBound": app_info.get("channelbound").split(",") if app_info.get("channelbound") else [],
-                "logo": app_info.get("applogo"),
-                "poster": app_info.get("posterlogo"),
-                "synopsis": {
-                    "en-IE": app_info.get("synopsis.en-IE")
-                } if app_info.get("synopsis.en-IE") else None,
-                "toasterMessage": {
-                    "en-IE": app_info.get("toastermessage.en-IE")
-                } if app_info.get("toastermessage.en-IE") else None,
-            }
-            applications.append(app)
-
-        # AVAD
-        avad = avad_data.get(channel_id, {})
-
-        # TSTV
-        tstv = tstv_data.get(channel_id, {})
-
-        # Trickplay
-        trickplay = trickplaycontrol_data.get(channel_id, {})
-
-        final_json["channels"].append({
-            "id": channel_id,
-            "title": channel_info.get("Name"),
-            "description": channel_info.get("Description"),
-            "longDescription": channel_info.get("LongDescription"),
-            "type": channel_info.get("Type"),
-            "serviceGenreIds": channel_info.get("ServiceGenre", "").split(",") if channel_info.get("ServiceGenre") else [],
-            "replayable": channel_info.get("Replayable", "false").lower() == "true",
-            "startOver": channel_info.get("StartOver", "false").lower() == "true",
-            "catchUp": channel_info.get("CatchUp", "false").lower() == "true",
-            "ottFollow": channel_info.get("OTTFollow", "false").lower() == "true",
-            "casId": channel_info.get("CasId"),
-            "providerId": channel_info.get("ProviderId"),
-            "logo": channel_info.get("FocusedLogo"),
-            "poster": channel_info.get("Poster"),
-            "locations": locations,
-            "applications": applications,
-            "avad": avad,
-            "tstv": tstv,
-            "trickplay": trickplay
-        })
-
-    # Create output directory if it doesn't exist
-    output_dir = os.path.dirname(output_file)
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    with open(output_file, "w") as f:
-        json.dump(final_json, f, indent=4)
+def reference_tables(data):
+    # The loaded frames in the shapes integrity.build_index() reads (those of
+    # load_table()); channels carry the reference columns
+    channels = _with_service_ids(data["channels"])
+    qam = _with_service_ids(data["qam_locations"])
+    qam_locations = {}
+    for service_id, region in zip(_tolist(qam["ServiceId"]), _tolist(_text(qam, "QAMRegion"))):
+        qam_locations.setdefault(service_id, []).append({"QAMRegion": region})
+    return {
+        **data,
+        "channel_refs": {
+            service_id: dict(zip(REFERENCE_COLUMNS, values))
+            for service_id, *values in zip(_tolist(channels["ServiceId"]),
+                                           *(_tolist(_text(channels, col)) for col in REFERENCE_COLUMNS))
+        },
+        "channel_lineup": {
+            lineup["channelMapGroup"]: [(entry["serviceId"], entry["channelNumbers"]) for entry in lineup["lineup"]]
+            for lineup in iter_lineups(data)
+        },
+        "qam_locations": qam_locations,
+        "ott_locations": dict.fromkeys(_tolist(_with_service_ids(data["ott_locations"])["ServiceId"])),
+        **{name: build_kv_map(data[name]) for name in ("apps", "avad", "trickplaycontrol")},
+    }
+
+def generate_json(input_dir, output_file, workers=None, processes=False, stream=False, cache_dir=None,
+                  deployment_id=DEFAULT_DEPLOYMENT, output_format="pretty", compact=False, validate=False,
+                  metrics=None, memory_budget=None, snapshot_dir=None, check_references=False):
+    # validate=True checks each section as it is written, "thread" does the
+    # checking on a worker thread. metrics takes a metrics.Metrics to record
+    # per-stage timings in. memory_budget and snapshot_dir: see
+    # table_readers(). check_references warns about dangling references
+    # between the loaded tables (see integrity.py).
+    if metrics is not None:
+        metrics.start()
+    data = None
+    written = False
+    try:
+        readers = table_readers(compact, memory_budget, snapshot_dir)
+        if cache_dir:
+            engine = sys.modules[__name__]
+            sections = render_cached(engine, input_dir, cache_dir, workers=workers, processes=processes,
+                                     deployment_id=deployment_id, output_format=output_format, readers=readers)
+        else:
+            load = load_tables if metrics is None else metrics.load_tables
+            data = load(input_dir, readers, workers=workers, processes=processes)
+            sections = build_sections(data, stream=stream, deployment_id=deployment_id, metrics=metrics)
+        if check_references:
+            # The section cache only loads the tables of stale sections, so the
+            # index has its own read there
+            index = build_index(reference_tables(data)) if data is not None else load_index(input_dir, workers)
+            warn_dangling(index, input_dir)
+        if metrics is not None:
+            sections = metrics.sections(sections, data)
+        if validate:
+            sections = validated(sections, threaded=validate == "thread")
+        write_json(sections, output_file, output_format=output_format)
+        written = True
+    finally:
+        # Also after a failed run (e.g. a ValidationError), which leaves the
+        # previous output in place
+        if metrics is not None:
+            metrics.finish(output_file if written else None, url_rewriter(data).hits if data is not None else None)
 
 if __name__ == "__main__":
     generate_json("input_csv", "output/output.json")
@@ -0,0 +1,182 @@
+import argparse
+import json
+import sys
+import time
+from functools import partial
+
+from tables import load_table, load_tables
+
+# Join index over the input tables, built once after they are loaded. Every
+# reference between two tables is a relation; each one is indexed in both
+# directions, so "which channels use linear product X" (sources) and "which
+# products does channel Y use" (targets) are single dict lookups:
+#
+#   relation        source                 target
+#   serviceGenre    channel                service genre id (ServiceGenre.csv)
+#   providerId      channel                ProviderId (providers.csv)
+#   providerName    channel                ProviderName (providers.csv)
+#   linearProduct   channel                Linear Products.csv id
+#   replayProduct   channel                Replay Products.csv rule
+#   lineup          channel map group      channel
+#   qamRegion       QAM region (LSA)       channel
+#   ottLocation     channel                channel
+#   app             channel                channel
+#   avad            channel                channel
+#   trickplay       channel                channel
+#   cityGroup       city id                channel map group
+#
+# Building the index walks every reference once and records the ones whose
+# target does not exist as dangling.
+
+# relation: entity whose keys the targets must be
+RELATIONS = {
+    "serviceGenre": "serviceGenres",
+    "providerId": "providerIds",
+    "providerName": "providerNames",
+    "linearProduct": "linearProducts",
+    "replayProduct": "replayProducts",
+    "lineup": "channels",
+    "qamRegion": "channels",
+    "ottLocation": "channels",
+    "app": "channels",
+    "avad": "channels",
+    "trickplay": "channels",
+    "cityGroup": "channelMapGroups",
+}
+
+# Channel columns holding a comma separated list of references
+CHANNEL_REFERENCES = {
+    "ServiceGenre": "serviceGenre",
+    "ProviderId": "providerId",
+    "ProviderName": "providerName",
+    "LinearProducts": "linearProduct",
+    "ReplayProductizingRules": "replayProduct",
+}
+
+INDEX_TABLES = (
+    "channel_refs", "service_genres", "providers", "linear_products", "replay_products", "channel_lineup",
+    "qam_locations", "ott_locations", "apps", "avad", "trickplaycontrol", "city_mapping",
+)
+
+
+def _split(cell):
+    return [part.strip() for part in cell.split(",") if part.strip()] if cell else []
+
+
+def _replay_rule(product_id):
+    # Replay product ids are crid://<provider>/replayproduct/<rule>; channels
+    # refer to them by the rule alone
+    return product_id.rsplit("/", 1)[-1]
+
+
+class JoinIndex:
+    def __init__(self):
+        self.keys = {}
+        self.forward = {relation: {} for relation in RELATIONS}
+        self.reverse = {relation: {} for relation in RELATIONS}
+        self.dangling = {relation: [] for relation in RELATIONS}
+        self.references = dict.fromkeys(RELATIONS, 0)
+
+    def add_keys(self, entity, keys):
+        self.keys.setdefault(entity, set()).update(key for key in keys if key)
+
+    def link(self, relation, source, target):
+        # Both directions keep insertion order and drop repeats (a channel
+        # has several QAM locations in the same region)
+        self.forward[relation].setdefault(source, {})[target] = None
+        self.reverse[relation].setdefault(target, {})[source] = None
+        self.references[relation] += 1
+        if target not in self.keys.get(RELATIONS[relation], ()):
+            self.dangling[relation].append((source, target))
+
+    def targets(self, relation, source):
+        return list(self.forward[relation].get(source, ()))
+
+    def sources(self, relation, target):
+        return list(self.reverse[relation].get(target, ()))
+
+    def channels_using_product(self, product_id):
+        return self.sources("linearProduct", product_id)
+
+    def channels_in_region(self, region):
+        # region is a QAM region (LSA) or a channel map group
+        return self.targets("qamRegion", region) or self.targets("lineup", region)
+
+    def report(self):
+        return {
+            relation: {
+                "target": RELATIONS[relation],
+                "references": self.references[relation],
+                "dangling": [{"source": source, "target": target} for source, target in dangling],
+            }
+            for relation, dangling in self.dangling.items()
+        }
+
+    def dangling_count(self):
+        return sum(len(dangling) for dangling in self.dangling.values())
+
+
+def build_index(data):
+    # data: the INDEX_TABLES as load_table() returns them
+    index = JoinIndex()
+    index.add_keys("channels", data["channel_refs"])
+    index.add_keys("serviceGenres", [genre["id"] for genre in data["service_genres"]["serviceGenre"]])
+    index.add_keys("providerIds", [row.get("ProviderId") for row in data["providers"]])
+    index.add_keys("providerNames", [row.get("ProviderName") for row in data["providers"]])
+    index.add_keys("linearProducts", [row["id"] for row in data["linear_products"]])
+    index.add_keys("replayProducts", [_replay_rule(row["id"]) for row in data["replay_products"] if row["id"]])
+    index.add_keys("channelMapGroups", data["channel_lineup"])
+
+    for channel_id, row in data["channel_refs"].items():
+        for column, relation in CHANNEL_REFERENCES.items():
+            for target in _split(row.get(column)):
+                index.link(relation, channel_id, target)
+    for group, entries in data["channel_lineup"].items():
+        for channel_id, _ in entries:
+            index.link("lineup", group, channel_id)
+    for channel_id, rows in data["qam_locations"].items():
+        for row in rows:
+            index.link("qamRegion", row.get("QAMRegion"), channel_id)
+    for relation, name in (("ottLocation", "ott_locations"), ("app", "apps"), ("avad", "avad"),
+                           ("trickplay", "trickplaycontrol")):
+        for channel_id in data[name]:
+            index.link(relation, channel_id, channel_id)
+    for city, group in data["city_mapping"].items():
+        index.link("cityGroup", city, group)
+    return index
+
+
+def load_index(input_dir, workers=None):
+    readers = {name: partial(load_table, name) for name in INDEX_TABLES}
+    return build_index(load_tables(input_dir, readers, workers=workers))
+
+
+def warn_dangling(index, input_dir):
+    dangling = index.dangling_count()
+    if dangling:
+        print(f"Warning: {dangling} dangling reference(s) in {input_dir}, see integrity.py")
+    return dangling
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the references between the ACM input tables.")
+    parser.add_argument("input_dir", nargs="?", default="input_csv")
+    parser.add_argument("--report", help="write the dangling references to this JSON file")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    index = load_index(args.input_dir)
+    report = index.report()
+    for relation, entry in report.items():
+        for ref in entry["dangling"]:
+            print(f"{relation}: {ref['source']} -> {ref['target']} not in {entry['target']}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=4)
+    dangling = index.dangling_count()
+    print(f"{args.input_dir}: {dangling} dangling reference(s) in {time.perf_counter() - started:.3f}s")
+    return 1 if dangling else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
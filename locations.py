@@ -0,0 +1,53 @@
+import hashlib
+import json
+
+from writer import StreamObject
+
+# Every QAM/OTT location is interned once, keyed by its full content plus
+# its region, and published in the top-level locations map. Channels refer
+# to locations by id. Ids are derived from the content alone, so a channel
+# record computes the same id as the registry without sharing any state
+# with it, and an unchanged location keeps its id from one run to the next.
+
+
+def location_id(location, region=None):
+    digest = hashlib.sha1(json.dumps([region, location], sort_keys=True).encode()).hexdigest()[:16]
+    return f"{'qam' if location['type'] == 'qam' else 'ip'}-{digest}"
+
+
+class LocationRegistry:
+    def __init__(self):
+        self.qam = {}
+        self.ip = {}
+
+    def add(self, location, region=None, key=None):
+        # key: location_id(location, region), when the caller already has it
+        if key is None:
+            key = location_id(location, region)
+        if location["type"] == "qam":
+            self.qam.setdefault(region, {}).setdefault(key, location)
+        else:
+            self.ip.setdefault(key, location)
+        return key
+
+    def __len__(self):
+        return sum(len(locations) for locations in self.qam.values()) + len(self.ip)
+
+    def section(self):
+        return {
+            "qamLocations": [
+                {"lsa": region, "locations": [{"id": key, **location} for key, location in locations.items()]}
+                for region, locations in self.qam.items()
+            ],
+            "ipLocations": [{"id": key, **location} for key, location in self.ip.items()],
+        }
+
+    def stream_section(self):
+        # section() for the streaming writer, one location at a time
+        return StreamObject(
+            qamLocations=(
+                StreamObject(lsa=region, locations=({"id": key, **location} for key, location in locations.items()))
+                for region, locations in self.qam.items()
+            ),
+            ipLocations=({"id": key, **location} for key, location in self.ip.items()),
+        )
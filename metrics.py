@@ -0,0 +1,248 @@
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+
+from section_cache import SECTION_TABLES
+from tables import TABLES, line_count, load_tables, table_path
+from writer import RawJSON, is_stream
+
+# Per-stage instrumentation for one generation, passed to
+# generate_json(metrics=...). Every stage records wall and CPU time and row
+# counts:
+#
+#   read:<table>     rows_in  data lines in the CSV
+#                    rows_out records in the parsed table
+#   build:<section>  one section, or one stage of it, built up front (unless
+#                    stream=True) or timed while the writer pulls a streamed
+#                    or lazily built one; rows_in are the records of the
+#                    tables it is built from, rows_out the items it produced.
+#                    Without stream, the channels are built in three stages:
+#                    build:channels.locations (location records and ids),
+#                    build:channels.applications and build:channels (the
+#                    channel records); the pandas engine adds
+#                    build:channels.fields (the parsed channel columns)
+#   build            the rest of building the sections up front (the
+#                    constant and pass-through ones); rows_out is the number
+#                    of sections
+#   serialize        writing the document (and validating it, if enabled),
+#                    minus the time spent building lazy sections in it
+#
+# url_rewrites holds the hits of each URL rewriting rule of the deployment
+# (see urls.py) in the generation.
+#
+# A stage's cpu_seconds is the CPU time of the thread that ran it, so build
+# and serialize leave out the reader and validation threads; the totals'
+# cpu_seconds is the whole process's.
+#
+# The totals add the peak traced memory when trace_memory=True, and
+# profile_file dumps cProfile stats for the calling thread.
+
+
+def _rows(value):
+    # Records in a parsed table: a DataFrame's rows, the rows of a grouped
+    # table, or the entries of anything else
+    if isinstance(value, dict) and value and all(isinstance(v, list) for v in value.values()):
+        return sum(len(v) for v in value.values())
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+class _TimedReader:
+    # Picklable, so load_tables(processes=True) can ship it to a worker
+    def __init__(self, read):
+        self.read = read
+
+    def __call__(self, input_dir):
+        started_wall, started_cpu = time.perf_counter(), time.thread_time()
+        result = self.read(input_dir)
+        return result, time.perf_counter() - started_wall, time.thread_time() - started_cpu
+
+
+class Metrics:
+    def __init__(self, engine, deployment_id, trace_memory=False, profile_file=None):
+        self.labels = {"engine": engine, "deployment": deployment_id}
+        self.trace_memory = trace_memory
+        self.profile_file = profile_file
+        self.stages = {}
+        self.totals = {}
+        self.url_rewrites = {}
+        # build:<section> stages timed before / while the document is written
+        self._built = []
+        self._lazy = []
+
+    def _stage(self, name, seconds, cpu_seconds, rows_in=None, rows_out=None):
+        self.stages[name] = {
+            "seconds": round(seconds, 6),
+            "cpu_seconds": round(cpu_seconds, 6),
+            "rows_in": rows_in,
+            "rows_out": rows_out,
+        }
+
+    def start(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        self.profiler = cProfile.Profile() if self.profile_file else None
+        if self.profiler:
+            self.profiler.enable()
+        self.started = (time.perf_counter(), time.process_time())
+        self.mark = (time.perf_counter(), time.thread_time())
+
+    def load_tables(self, input_dir, readers, workers=None, processes=False):
+        timed = {name: _TimedReader(read) for name, read in readers.items()}
+        data = {}
+        for name, (table, seconds, cpu_seconds) in load_tables(input_dir, timed, workers, processes).items():
+            spec = TABLES[name]
+            rows_in = max(line_count(table_path(input_dir, spec)) - spec.header_rows, 0)
+            self._stage(f"read:{name}", seconds, cpu_seconds, rows_in, _rows(table))
+            data[name] = table
+        self.mark = (time.perf_counter(), time.thread_time())
+        return data
+
+    def _rows_in(self, tables):
+        rows = [self.stages[f"read:{name}"]["rows_out"] for name in tables if f"read:{name}" in self.stages]
+        return sum(count or 0 for count in rows) if rows else None
+
+    def build(self, section, fn, tables=None, count=_rows):
+        # Builds one section (or stage of one) up front with fn() and times
+        # it; tables defaults to the ones the section is rendered from, and
+        # count(value) gives rows_out
+        if tables is None:
+            tables = SECTION_TABLES.get(section, ())
+        started_wall, started_cpu = time.perf_counter(), time.thread_time()
+        value = fn()
+        self._stage(f"build:{section}", time.perf_counter() - started_wall, time.thread_time() - started_cpu,
+                    self._rows_in(tables), count(value))
+        self._built.append(f"build:{section}")
+        return value
+
+    def sections(self, sections, data=None):
+        # Times the rest of the up-front build since load_tables() and wraps
+        # the lazy sections so their build is timed as the writer pulls them
+        wall, cpu = self.mark
+        if data is not None:
+            built = [self.stages[name] for name in self._built]
+            self._stage(
+                "build",
+                time.perf_counter() - wall - sum(stage["seconds"] for stage in built),
+                time.thread_time() - cpu - sum(stage["cpu_seconds"] for stage in built),
+                rows_out=len(sections),
+            )
+        wrapped = {}
+        for section, value in sections.items():
+            rows_in = None
+            if data is not None:
+                rows_in = sum(_rows(data[name]) or 0 for name in SECTION_TABLES.get(section, ()) if name in data)
+            if isinstance(value, RawJSON):
+                pass
+            elif is_stream(value):
+                value = self._timed_stream(f"build:{section}", value, rows_in)
+            elif callable(value):
+                value = self._timed_callable(f"build:{section}", value, rows_in)
+            wrapped[section] = value
+        self.mark = (time.perf_counter(), time.thread_time())
+        return wrapped
+
+    def _timed_stream(self, name, items, rows_in):
+        seconds = cpu_seconds = 0.0
+        count = 0
+        items = iter(items)
+        while True:
+            started_wall, started_cpu = time.perf_counter(), time.thread_time()
+            item = next(items, self)
+            seconds += time.perf_counter() - started_wall
+            cpu_seconds += time.thread_time() - started_cpu
+            if item is self:
+                break
+            count += 1
+            yield item
+        self._stage(name, seconds, cpu_seconds, rows_in, count)
+        self._lazy.append(name)
+
+    def _timed_callable(self, name, fn, rows_in):
+        def build():
+            started_wall, started_cpu = time.perf_counter(), time.thread_time()
+            value = fn()
+            self._stage(name, time.perf_counter() - started_wall, time.thread_time() - started_cpu, rows_in,
+                        _rows(value))
+            self._lazy.append(name)
+            return value
+        return build
+
+    def finish(self, output_file=None, url_rewrites=None):
+        # Everything since sections() that was not spent building a lazy
+        # section went into writing the document
+        self.url_rewrites = dict(url_rewrites or {})
+        lazy = [self.stages[name] for name in self._lazy]
+        wall, cpu = self.mark
+        self._stage(
+            "serialize",
+            time.perf_counter() - wall - sum(stage["seconds"] for stage in lazy),
+            time.thread_time() - cpu - sum(stage["cpu_seconds"] for stage in lazy),
+        )
+        wall, cpu = self.started
+        self.totals = {
+            "seconds": round(time.perf_counter() - wall, 6),
+            "cpu_seconds": round(time.process_time() - cpu, 6),
+            "finished": round(time.time(), 3),
+        }
+        if output_file and os.path.exists(output_file):
+            self.totals["output_bytes"] = os.path.getsize(output_file)
+        if self.trace_memory:
+            self.totals["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        if self.profiler:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile_file)
+
+    def to_dict(self):
+        return {**self.labels, "totals": self.totals, "stages": self.stages, "url_rewrites": self.url_rewrites}
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+    def prometheus(self):
+        labels = ",".join(f'{key}="{_escape(value)}"' for key, value in self.labels.items())
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for extra, value in samples:
+                if value is not None:
+                    lines.append(f"{name}{{{labels}{extra}}} {value}")
+
+        stages = self.stages.items()
+        metric("acm_stage_seconds", "gauge", "Wall time of a generation stage.",
+               [(f',stage="{_escape(name)}"', stage["seconds"]) for name, stage in stages])
+        metric("acm_stage_cpu_seconds", "gauge", "CPU time of a generation stage.",
+               [(f',stage="{_escape(name)}"', stage["cpu_seconds"]) for name, stage in stages])
+        metric("acm_stage_rows_in", "gauge", "Records consumed by a generation stage.",
+               [(f',stage="{_escape(name)}"', stage["rows_in"]) for name, stage in stages])
+        metric("acm_stage_rows_out", "gauge", "Records produced by a generation stage.",
+               [(f',stage="{_escape(name)}"', stage["rows_out"]) for name, stage in stages])
+        metric("acm_url_rewrites", "gauge", "URLs rewritten by a rule of the deployment in the generation.",
+               [(f',rule="{_escape(rule)}"', hits) for rule, hits in self.url_rewrites.items()])
+        metric("acm_generation_seconds", "gauge", "Wall time of the whole generation.", [("", self.totals.get("seconds"))])
+        metric("acm_generation_cpu_seconds", "gauge", "CPU time of the whole generation.",
+               [("", self.totals.get("cpu_seconds"))])
+        metric("acm_generation_peak_bytes", "gauge", "Peak traced memory of the generation.",
+               [("", self.totals.get("peak_bytes"))])
+        metric("acm_output_bytes", "gauge", "Size of the written document.", [("", self.totals.get("output_bytes"))])
+        metric("acm_last_success_timestamp_seconds", "gauge", "When the last generation finished.",
+               [("", self.totals.get("finished"))])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        # The textfile collector may read at any time, so replace atomically
+        with open(path + ".tmp", "w") as f:
+            f.write(self.prometheus())
+        os.replace(path + ".tmp", path)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
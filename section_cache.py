@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import sys
+import types
+
+from tables import TABLES, empty_table, file_digest, load_tables, table_path
+from writer import FORMATS, RawJSON, iter_section
+
+# Which input tables each output section is rendered from. Sections with no
+# inputs are constant and are only re-rendered when the generator changes.
+SECTION_TABLES = {
+    "diagnostics": (),
+    "classifications": ("service_genres",),
+    "recommendationTopics": (),
+    "deployment": (),
+    "cityIdMapping": ("city_mapping",),
+    "productizing": ("linear_products", "replay_products"),
+    "channels": ("channels", "qam_locations", "ott_locations", "apps", "avad", "tstv", "trickplaycontrol", "endpoints"),
+    "lineups": ("channel_lineup",),
+    "locations": ("channels", "qam_locations", "ott_locations", "endpoints"),
+    "relatedMaterials": (),
+    "applications": (),
+    "providers": ("providers", "endpoints"),
+}
+
+def input_digests(input_dir, names):
+    return {name: file_digest(table_path(input_dir, TABLES[name])) for name in names}
+
+
+def code_files(engine):
+    # The engine's file and that of every module of this directory it uses,
+    # directly or through another one (locations, converters, validate, ...)
+    here = os.path.dirname(os.path.abspath(__file__))
+    files, pending = set(), [engine]
+    while pending:
+        module = pending.pop()
+        path = os.path.abspath(getattr(module, "__file__", None) or "")
+        if os.path.dirname(path) != here or path in files:
+            continue
+        files.add(path)
+        for value in vars(module).values():
+            name = value.__name__ if isinstance(value, types.ModuleType) else getattr(value, "__module__", None)
+            if isinstance(name, str) and name in sys.modules:
+                pending.append(sys.modules[name])
+    return sorted(files)
+
+
+def code_digest(engine):
+    # Any change to the engine or a module it uses invalidates the cache.
+    digest = hashlib.sha256()
+    for path in code_files(engine):
+        digest.update(f"{os.path.basename(path)}={file_digest(path)}".encode())
+    return digest.hexdigest()
+
+
+def section_key(code, section, digests, deployment_id, output_format):
+    digest = hashlib.sha256(f"{code}:{section}:{deployment_id}:{output_format}".encode())
+    for name in SECTION_TABLES[section]:
+        digest.update(f":{name}={digests[name]}".encode())
+    return digest.hexdigest()
+
+
+def _cache_path(cache_dir, section, key):
+    return os.path.join(cache_dir, f"{section}.{key[:32]}.json")
+
+
+def _store(cache_dir, section, key, text):
+    for name in os.listdir(cache_dir):
+        if name.startswith(f"{section}.") and name.endswith(".json"):
+            os.remove(os.path.join(cache_dir, name))
+    path = _cache_path(cache_dir, section, key)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
+
+
+def render_cached(engine, input_dir, cache_dir, workers=None, processes=False, deployment_id=None,
+                  output_format="pretty", readers=None):
+    # Returns the document sections in output order, each one a RawJSON
+    # fragment. Only the sections whose inputs changed since the cached
+    # render are parsed and rendered again; the rest are read back as bytes.
+    if deployment_id is None:
+        deployment_id = engine.DEFAULT_DEPLOYMENT
+    if readers is None:
+        readers = engine.READERS
+    os.makedirs(cache_dir, exist_ok=True)
+    digests = input_digests(input_dir, engine.READERS)
+    code = code_digest(engine)
+
+    keys = {
+        section: section_key(code, section, digests, deployment_id, output_format) for section in SECTION_TABLES
+    }
+    fragments = {}
+    for section, key in keys.items():
+        path = _cache_path(cache_dir, section, key)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                fragments[section] = RawJSON(f.read())
+
+    stale = [section for section in SECTION_TABLES if section not in fragments]
+    if stale:
+        needed = {name for section in stale for name in SECTION_TABLES[section]}
+        data = load_tables(input_dir, {name: read for name, read in readers.items() if name in needed},
+                           workers=workers, processes=processes)
+        # Tables no stale section depends on are never read.
+        for name in engine.READERS:
+            data.setdefault(name, empty_table(TABLES[name]))
+        sections = engine.build_sections(data, stream=True, deployment_id=deployment_id)
+        for section in stale:
+            text = "".join(iter_section(sections[section], FORMATS[output_format]))
+            _store(cache_dir, section, keys[section], text)
+            fragments[section] = RawJSON(text)
+
+    manifest = {
+        "inputs": digests,
+        "sections": {
+            section: hashlib.sha256(fragments[section].encode()).hexdigest() for section in SECTION_TABLES
+        },
+        "rendered": stale,
+    }
+    with open(os.path.join(cache_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=4)
+    print(f"Rendered {len(stale)} of {len(SECTION_TABLES)} sections: {', '.join(stale) or 'none'}")
+
+    return {section: fragments[section] for section in SECTION_TABLES}
@@ -0,0 +1,236 @@
+import argparse
+import gzip
+import hashlib
+import importlib
+import json
+import threading
+import time
+from functools import cached_property
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+from batch import ENGINES
+from section_cache import SECTION_TABLES
+from watch import WarmState
+from writer import FORMATS, encode, iter_json
+
+# Serves the latest generation over HTTP from memory, regenerating it in the
+# background as the inputs change (see watch.py). Every response has a
+# strong ETag and honours If-None-Match, and gzip variants are compressed
+# once per generation rather than per request.
+#
+#   /acm                          the whole document
+#   /acm/sections/<name>          one top-level section
+#   /acm/channels/<serviceId>     one channel
+#   /acm/lineups/<channelMapGroup> one lineup
+#   /health                       the generation being served and whether
+#                                 the last regeneration failed (503 then)
+
+
+class Entity:
+    def __init__(self, body):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+    @cached_property
+    def gzip_body(self):
+        return gzip.compress(self.body, mtime=0)
+
+    @property
+    def gzip_etag(self):
+        return self.etag[:-1] + '-gz"'
+
+
+class Snapshot:
+    # One generation: the document plus an entity per section, channel and
+    # lineup, all encoded up front so a request is a dictionary lookup.
+    def __init__(self, fragments, indent):
+        self.generated = time.time()
+        self.document = Entity("".join(iter_json(fragments, indent)).encode("utf-8"))
+        # The whole document is what gets polled, so its gzip variant is
+        # built now rather than by the first request
+        self.document.gzip_body
+        sections = {section: json.loads(fragment) for section, fragment in fragments.items()}
+        values = {("sections", name): value for name, value in sections.items()}
+        values.update((("channels", channel["id"]), channel) for channel in sections["channels"])
+        values.update((("lineups", lineup["channelMapGroup"]), lineup) for lineup in sections["lineups"])
+        self.routes = {route: Entity(encode(value, indent).encode("utf-8")) for route, value in values.items()}
+
+    def lookup(self, path):
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        if parts == ["acm"]:
+            return self.document
+        if len(parts) == 3 and parts[0] == "acm":
+            return self.routes.get((parts[1], parts[2]))
+        return None
+
+
+def accepts_gzip(header):
+    # Accept-Encoding with its q-values: gzip;q=0 (or *;q=0 without a gzip
+    # entry) refuses gzip
+    qualities = {}
+    for part in (header or "").split(","):
+        coding, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+    quality = qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0.0)))
+    return quality > 0
+
+
+def _etag_matches(header, etag):
+    if header is None:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+class ACMRequestHandler(BaseHTTPRequestHandler):
+    server_version = "ACMServe/1.0"
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def _respond(self, send_body):
+        path = self.path.split("?", 1)[0]
+        if path.rstrip("/") == "/health":
+            self._respond_health(send_body)
+            return
+        snapshot = self.server.snapshot
+        entity = snapshot.lookup(path) if snapshot else None
+        if entity is None:
+            self.send_error(404 if snapshot else 503)
+            return
+
+        gzipped = accepts_gzip(self.headers.get("Accept-Encoding"))
+        body, etag = (entity.gzip_body, entity.gzip_etag) if gzipped else (entity.body, entity.etag)
+        if _etag_matches(self.headers.get("If-None-Match"), etag):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _respond_health(self, send_body):
+        health = self.server.health()
+        body = json.dumps(health, indent=4).encode("utf-8")
+        self.send_response(200 if health["status"] == "ok" else 503)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class ACMServer(ThreadingHTTPServer):
+    # snapshot is the last good generation; failure describes the last
+    # regeneration if it failed, until one succeeds again
+    def __init__(self, address, quiet=False):
+        super().__init__(address, ACMRequestHandler)
+        self.snapshot = None
+        self.failure = None
+        self.quiet = quiet
+        self.pending = []
+
+    def health(self):
+        if self.snapshot is None:
+            status = "starting" if self.failure is None else "failed"
+        else:
+            status = "ok" if self.failure is None else "stale"
+        return {
+            "status": status,
+            "generation": self.snapshot.document.etag if self.snapshot else None,
+            "generated": round(self.snapshot.generated, 3) if self.snapshot else None,
+            "pending": self.pending,
+            "lastFailure": self.failure,
+        }
+
+
+def refresh(server, state):
+    # Regenerates if an input changed; a failure is logged and recorded on
+    # the server, which keeps serving the last good generation
+    changed = []
+    try:
+        if state.poll() and state.pending:
+            changed, _ = state.reload()
+            fragments = {section: state.fragments[section] for section in SECTION_TABLES}
+            server.snapshot = Snapshot(fragments, FORMATS[state.output_format])
+            server.failure = None
+            print(f"Serving generation with ETag {server.snapshot.document.etag} (changed: {', '.join(changed)})")
+    except Exception as e:
+        server.failure = {"at": round(time.time(), 3), "error": f"{type(e).__name__}: {e}"}
+        serving = f"still serving {server.snapshot.document.etag}" if server.snapshot else "nothing to serve yet"
+        print(f"Error: regeneration failed, {serving} (pending: {', '.join(sorted(state.pending))}): "
+              f"{server.failure['error']}")
+    server.pending = sorted(state.pending)
+    return changed
+
+
+def _poll_forever(server, state, interval):
+    while True:
+        time.sleep(interval)
+        refresh(server, state)
+
+
+def make_server(state, host="127.0.0.1", port=8080, interval=1.0, quiet=False):
+    server = ACMServer((host, port), quiet)
+    refresh(server, state)
+    if interval:
+        threading.Thread(target=_poll_forever, args=(server, state, interval), daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the generated ACM document over HTTP.")
+    parser.add_argument("input_dir", nargs="?", default="input_csv")
+    parser.add_argument("--engine", default="csv", choices=list(ENGINES))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between input polls, 0 to disable")
+    parser.add_argument("--deployment-id")
+    parser.add_argument("--format", default="compact", choices=["pretty", "compact"])
+    parser.add_argument("--compact", action="store_true", help="load the wide tables as compact rows")
+    parser.add_argument("--quiet", action="store_true", help="do not log requests")
+    args = parser.parse_args()
+
+    state = WarmState(importlib.import_module(ENGINES[args.engine]), args.input_dir, args.deployment_id,
+                      args.format, args.compact)
+    server = make_server(state, args.host, args.port, args.interval, args.quiet)
+    print(f"Serving {args.input_dir} on http://{args.host}:{args.port}/acm")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
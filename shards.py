@@ -0,0 +1,128 @@
+import argparse
+import importlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from batch import ENGINES
+from tables import load_table, load_tables
+from writer import FORMATS, write_json
+
+# Splits the document into one shard per channel map group, so a set-top box
+# only downloads its own region. A shard keeps that group's lineup, the
+# channels the lineup lists, the locations those channels use (QAM ones only
+# in the group's own regions, see city_regions) and the cities mapped to the
+# group; every other section is shared and copied as is.
+#
+# The document is built once in memory; the shards are cut from it and
+# serialized in worker processes.
+
+# Filled in by _init_worker: the full document and the LSAs of every group
+_MODEL = {}
+
+
+def build_model(engine, input_dir, deployment_id=None):
+    data = load_tables(input_dir, engine.READERS)
+    sections = engine.build_sections(data, deployment_id=deployment_id or engine.DEFAULT_DEPLOYMENT)
+    document = {key: value() if callable(value) else value for key, value in sections.items()}
+    regions = {
+        group: {row.get("LSA") for row in rows} for group, rows in load_table("city_regions", input_dir).items()
+    }
+    return document, regions
+
+
+def cut_shard(document, group, lsas):
+    lineup = next(lineup for lineup in document["lineups"] if lineup["channelMapGroup"] == group)
+    service_ids = {entry["serviceId"] for entry in lineup["lineup"]}
+    locations = document["locations"]
+    qam_groups = [qam for qam in locations["qamLocations"] if qam["lsa"] in lsas]
+    available = {loc["id"] for qam in qam_groups for loc in qam["locations"]}
+    available.update(loc["id"] for loc in locations["ipLocations"])
+
+    channels = []
+    used = set()
+    for channel in document["channels"]:
+        if channel["id"] in service_ids:
+            channel = {**channel, "locations": [key for key in channel["locations"] if key in available]}
+            used.update(channel["locations"])
+            channels.append(channel)
+
+    shard = dict(document)
+    shard["cityIdMapping"] = {city: cmg for city, cmg in document["cityIdMapping"].items() if cmg == group}
+    shard["channels"] = channels
+    shard["lineups"] = [lineup]
+    shard["locations"] = {
+        "qamLocations": [
+            {"lsa": qam["lsa"], "locations": [loc for loc in qam["locations"] if loc["id"] in used]}
+            for qam in qam_groups
+        ],
+        "ipLocations": [loc for loc in locations["ipLocations"] if loc["id"] in used],
+    }
+    return shard
+
+
+def shard_file(group):
+    return group.replace("/", "_") + ".json"
+
+
+def _init_worker(model):
+    _MODEL.update(model)
+
+
+def _write_shard(job):
+    group, output_file, output_format = job
+    shard = cut_shard(_MODEL["document"], group, _MODEL["regions"].get(group, set()))
+    write_json(shard, output_file, output_format=output_format)
+    return {
+        "channelMapGroup": group,
+        "file": os.path.basename(output_file),
+        "cityIds": list(shard["cityIdMapping"]),
+        "channels": len(shard["channels"]),
+        "bytes": os.path.getsize(output_file),
+    }
+
+
+def write_shards(engine_name, input_dir, output_dir, workers=None, deployment_id=None, output_format="pretty"):
+    started = time.perf_counter()
+    engine = importlib.import_module(ENGINES[engine_name])
+    document, regions = build_model(engine, input_dir, deployment_id)
+    model = {"document": document, "regions": regions}
+    os.makedirs(output_dir, exist_ok=True)
+
+    extension = ".gz" if output_format == "gzip" else ""
+    jobs = [
+        (lineup["channelMapGroup"], os.path.join(output_dir, shard_file(lineup["channelMapGroup"]) + extension),
+         output_format)
+        for lineup in document["lineups"]
+    ]
+    if workers is not None and workers <= 1:
+        _init_worker(model)
+        shards = [_write_shard(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model,)) as pool:
+            shards = list(pool.map(_write_shard, jobs))
+
+    index = {"deployment": document["deployment"]["id"], "shards": shards}
+    with open(os.path.join(output_dir, "shards.json"), "w") as f:
+        json.dump(index, f, indent=4)
+    print(f"Wrote {len(shards)} shards to {output_dir} in {time.perf_counter() - started:.3f}s")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write one ACM document per channel map group.")
+    parser.add_argument("input_dir", nargs="?", default="input_csv")
+    parser.add_argument("output_dir", nargs="?", default="output/shards")
+    parser.add_argument("--engine", default="csv", choices=list(ENGINES))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--deployment-id")
+    parser.add_argument("--format", default="pretty", choices=list(FORMATS))
+    args = parser.parse_args()
+
+    write_shards(args.engine, args.input_dir, args.output_dir, workers=args.workers,
+                 deployment_id=args.deployment_id, output_format=args.format)
+
+
+if __name__ == "__main__":
+    main()
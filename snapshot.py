@@ -0,0 +1,175 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+from array import array
+
+# Binary columnar snapshot of a parsed input table, so a later run can skip
+# decoding the CSV. One file per (source content, parse) pair:
+#
+#   b"ACMSNAP1" | u32 meta length | meta JSON | column blocks (8-byte
+#   aligned) | u64 (start, length) per block | u64 block count
+#
+# The meta lists the column names, the row count and, per column, where its
+# blocks are. A text column is a string pool (one UTF-8 blob plus u32 start
+# offsets into the decoded text) and a u32 code per row, 0 meaning no cell.
+# A column whose cells are all canonical integers or empty is stored as an
+# int64 array instead (QAM Frequency, SymbolRate, ProgramNbr, ...), with two
+# sentinels for an empty and a missing cell. Blocks are read through a
+# memory map without copying; only the distinct pool strings are decoded.
+
+MAGIC = b"ACMSNAP1"
+MISSING = -(2 ** 63)
+EMPTY = MISSING + 1
+_INT_MIN, _INT_MAX = EMPTY + 1, 2 ** 63 - 1
+
+
+def snapshot_file(snapshot_dir, digest, variant):
+    # variant identifies the parse (reader, spec), so each engine snapshots
+    # exactly what its own parser produced
+    key = hashlib.sha256(f"{digest}:{variant}".encode()).hexdigest()[:32]
+    return os.path.join(snapshot_dir, f"{key}.snap")
+
+
+def _int_column(values):
+    ints = array("q")
+    for value in values:
+        if value is None:
+            ints.append(MISSING)
+        elif value == "":
+            ints.append(EMPTY)
+        else:
+            try:
+                number = int(value)
+            except ValueError:
+                return None
+            if str(number) != value or not _INT_MIN <= number <= _INT_MAX:
+                return None
+            ints.append(number)
+    return ints
+
+
+def _text_column(values):
+    codes = {}
+    column = array("I")
+    for value in values:
+        if value is None:
+            column.append(0)
+        else:
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(codes) + 1
+            column.append(code)
+    offsets = array("I", [0])
+    for value in codes:
+        offsets.append(offsets[-1] + len(value))
+    return "".join(codes).encode("utf-8"), offsets, column
+
+
+def write_snapshot(path, names, columns, rows=None):
+    # columns: one list of cell values (str, or None for no cell) per column
+    blocks = []
+    meta = {"rows": len(columns[0]) if columns else rows or 0, "columns": []}
+    for name, values in zip(names, columns):
+        ints = _int_column(values) if any(values) else None
+        if ints is not None:
+            meta["columns"].append({"name": name, "kind": "int", "values": len(blocks)})
+            blocks.append(ints.tobytes())
+        else:
+            blob, offsets, codes = _text_column(values)
+            meta["columns"].append({"name": name, "kind": "text", "pool": len(blocks), "offsets": len(blocks) + 1,
+                                    "codes": len(blocks) + 2})
+            blocks += [blob, offsets.tobytes(), codes.tobytes()]
+
+    meta_bytes = json.dumps(meta).encode("utf-8")
+    position = len(MAGIC) + 4 + len(meta_bytes)
+    spans = []
+    for block in blocks:
+        position += -position % 8
+        spans.append((position, len(block)))
+        position += len(block)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(meta_bytes)) + meta_bytes)
+        for (start, _), block in zip(spans, blocks):
+            f.write(b"\0" * (start - f.tell()))
+            f.write(block)
+        f.write(array("Q", [n for span in spans for n in span]).tobytes())
+        f.write(struct.pack("<Q", len(spans)))
+    os.replace(path + ".tmp", path)
+
+
+class Snapshot:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a table snapshot")
+        meta_length = struct.unpack_from("<I", view, len(MAGIC))[0]
+        meta = json.loads(bytes(view[len(MAGIC) + 4:len(MAGIC) + 4 + meta_length]))
+        count = struct.unpack_from("<Q", view, len(view) - 8)[0]
+        spans = view[len(view) - 8 - 16 * count:len(view) - 8].cast("Q")
+        self._blocks = [view[spans[2 * i]:spans[2 * i] + spans[2 * i + 1]] for i in range(count)]
+        self.rows = meta["rows"]
+        self._columns = meta["columns"]
+        self.names = [column["name"] for column in self._columns]
+
+    def is_int(self, i):
+        return self._columns[i]["kind"] == "int"
+
+    def ints(self, i):
+        # The int64 block of an integer column as a zero-copy memoryview,
+        # MISSING/EMPTY for cells without a number
+        return self._blocks[self._columns[i]["values"]].cast("q")
+
+    def pool(self, i):
+        # Distinct values of a text column; code k refers to pool[k - 1]
+        column = self._columns[i]
+        blob = str(self._blocks[column["pool"]], "utf-8")
+        offsets = self._blocks[column["offsets"]].cast("I")
+        return [blob[offsets[k]:offsets[k + 1]] for k in range(len(offsets) - 1)]
+
+    def codes(self, i):
+        # The u32 codes of a text column as a zero-copy memoryview
+        return self._blocks[self._columns[i]["codes"]].cast("I")
+
+    def _decoder(self, i):
+        # decode(start, stop) -> cell values of rows start..stop of column i,
+        # as str or None where a row has no cell
+        if self.is_int(i):
+            ints = self.ints(i)
+            text = {MISSING: None, EMPTY: ""}
+            return lambda start, stop: [text[v] if v in text else text.setdefault(v, str(v)) for v in ints[start:stop]]
+        codes = self.codes(i)
+        lookup = [None, *self.pool(i)].__getitem__
+        return lambda start, stop: list(map(lookup, codes[start:stop]))
+
+    def column(self, i):
+        return self._decoder(i)(0, self.rows)
+
+    def iter_rows(self, keep=None, chunk_rows=None):
+        # Rows as the CSV reader gave them, or only the columns at the
+        # ascending positions in keep. Cells past the end of a short row are
+        # stored as None and dropped again here. chunk_rows bounds how many
+        # rows are decoded at a time.
+        if keep is None:
+            keep = range(len(self._columns))
+        if not keep:
+            yield from ([] for _ in range(self.rows))
+            return
+        decoders = [self._decoder(i) for i in keep]
+        chunk = chunk_rows or self.rows or 1
+        for start in range(0, self.rows, chunk):
+            for row in map(list, zip(*(decode(start, start + chunk) for decode in decoders))):
+                while row and row[-1] is None:
+                    row.pop()
+                yield row
+
+
+def write_rows(path, rows, names=()):
+    width = max(map(len, rows), default=0)
+    columns = [[row[i] if i < len(row) else None for row in rows] for i in range(width)]
+    names = list(names)[:width] + [None] * (width - len(names))
+    write_snapshot(path, names, columns, rows=len(rows))
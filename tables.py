@@ -0,0 +1,480 @@
+import configparser
+import csv
+import glob
+import hashlib
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from operator import itemgetter
+
+import snapshot
+from converters import CHANNEL_FIELDS, OTT_FIELDS, QAM_FIELDS, field_columns
+
+# Every input CSV is declared once here and loaded by load_table(). Both
+# generators share the specs; only the row source differs (csv.reader for
+# generate_json, pandas.read_csv for generate_json_pandas).
+#
+# Modes:
+#   records - list of dicts (header -> value, or `fields` name -> column)
+#   raw     - list of row lists, for files with a positional layout
+#   unique  - {key: row dict}, last row wins
+#   group   - {key: [row dict, ...]}
+#   kv      - {key: {row[value[0]]: row[value[1]]}}
+#   map     - {key: row[value]}
+#   unpivot - {column: [(key, cell), ...]} for a wide matrix, one entry per
+#             column other than the key and the ones listed in `value`;
+#             empty and NA cells are dropped
+#   genres  - the classifications of ServiceGenre.csv (see _fold_genres)
+#   ini     - {section: {option: value}} for a cfg file instead of a CSV
+#
+# `file` may be a glob pattern for inputs whose name varies per deployment;
+# the first match (by name) is read.
+#
+# Columns may be given by header name or by position.
+#
+# `columns` projects a table onto the named columns the output reads (plus
+# the key, value and converter columns); every other column is dropped
+# while the file is parsed and never reaches a row.
+#
+# compact=True stores the row dicts of the unique and group modes as Row
+# objects instead: a tuple of values plus one header index shared by the
+# whole table, with repeated cell values (CpeType, StreamingProtocol, region
+# codes, ...) stored once per table. Rows read like the dicts they replace.
+#
+# chunk_size is set by load_table(memory_budget=...): the rows are read
+# that many at a time, and compact rows share repeated values per chunk
+# rather than per table, so the table of distinct values is dropped after
+# every chunk instead of growing with every unique URL or key in the file.
+
+NA_VALUES = ("", "NA")
+
+
+@dataclass(frozen=True)
+class TableSpec:
+    file: str
+    mode: str = "records"
+    key: object = None
+    value: object = None
+    fields: dict = None
+    header_rows: int = 1
+    delimiter: str = ";"
+    converters: dict = None
+    optional: bool = False
+    compact: bool = False
+    columns: tuple = None
+    chunk_size: int = None
+
+
+# The columns the output reads, from the field tables the records are built
+# with (see converters.py); QAM locations are also grouped by region, and
+# channels keep the columns the reference check reads (see integrity.py)
+REFERENCE_COLUMNS = ("ServiceGenre", "ProviderId", "ProviderName", "LinearProducts", "ReplayProductizingRules")
+CHANNEL_COLUMNS = tuple(dict.fromkeys((*field_columns(CHANNEL_FIELDS), *REFERENCE_COLUMNS)))
+LOCATION_COLUMNS = field_columns(OTT_FIELDS)
+QAM_COLUMNS = ("QAMRegion", *field_columns(QAM_FIELDS))
+
+TABLES = {
+    "channels": TableSpec("Channels.csv", mode="unique", key="ServiceId", columns=CHANNEL_COLUMNS),
+    # The same sheet projected onto the columns that point into other tables,
+    # for the referential integrity check (see integrity.py)
+    "channel_refs": TableSpec("Channels.csv", mode="unique", key="ServiceId", columns=REFERENCE_COLUMNS),
+    "service_genres": TableSpec("ServiceGenre.csv", mode="genres"),
+    # One column per channel map group; Default is the operator's template
+    # column and is not published as a lineup of its own
+    "channel_lineup": TableSpec("Channel Lineup.csv", mode="unpivot", key="ServiceID", value=("Default",),
+                                optional=True),
+    "qam_locations": TableSpec("QAM Channel Location.csv", mode="group", key="ServiceId", optional=True,
+                               columns=QAM_COLUMNS),
+    "ott_locations": TableSpec("ottlocation.csv", mode="group", key="ServiceId", optional=True,
+                               columns=LOCATION_COLUMNS),
+    "linear_products": TableSpec("Linear Products.csv", fields={"id": 0, "edsId": 1}, header_rows=2),
+    "replay_products": TableSpec("Replay Products.csv", fields={"id": 0, "edsId": 1}, header_rows=2),
+    "apps": TableSpec("Apps.csv", mode="kv", key=0, value=(1, 2)),
+    "providers": TableSpec("providers.csv", optional=True),
+    "avad": TableSpec("AVAD.csv", mode="kv", key=0, value=(1, 2)),
+    "tstv": TableSpec("TSTV.csv", mode="kv", key=0, value=(1, 2)),
+    # ChannelIdProviderKey is padded with trailing blanks in the source sheet
+    "trickplaycontrol": TableSpec("Trickplaycontrol.csv", mode="kv", key=0, value=(1, 2), converters={0: str.strip}),
+    "city_mapping": TableSpec("EDS City Mapping.csv", mode="map", key=0, value=1),
+    # The same sheet by channel map group, for the QAM regions (LSA) of each
+    "city_regions": TableSpec("EDS City Mapping.csv", mode="group", key="CMG", optional=True),
+    # URL rewriting rules shipped with the deployment (see urls.py)
+    "endpoints": TableSpec("endpoints*.cfg", mode="ini", optional=True),
+}
+
+
+class Row:
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index, values):
+        self._index = index
+        self._values = values
+
+    def __getitem__(self, name):
+        i = self._index[name]
+        if i >= len(self._values):
+            raise KeyError(name)
+        return self._values[i]
+
+    def __getattr__(self, name):
+        # Only reached for names that are not slots or methods; the guard
+        # keeps pickle/copy probing for __setstate__ and friends off the index
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def get(self, name, default=None):
+        i = self._index.get(name)
+        return self._values[i] if i is not None and i < len(self._values) else default
+
+    def __contains__(self, name):
+        i = self._index.get(name)
+        return i is not None and i < len(self._values)
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return [name for name, i in self._index.items() if i < len(self._values)]
+
+    def items(self):
+        return [(name, self._values[i]) for name, i in self._index.items() if i < len(self._values)]
+
+    def __eq__(self, other):
+        return dict(self.items()) == (dict(other.items()) if isinstance(other, Row) else other)
+
+    def __repr__(self):
+        return f"Row({dict(self.items())!r})"
+
+
+def projected_columns(spec):
+    # The header names a projected table keeps, or None for all of them
+    if spec.columns is None:
+        return None
+    names = [spec.key, *(spec.value or ()), *(spec.converters or {}), *spec.columns]
+    return {name for name in names if isinstance(name, str)}
+
+
+def _project(spec, header, rows):
+    wanted = projected_columns(spec)
+    if wanted is None:
+        return header, rows
+    keep = [i for i, name in enumerate(header) if name in wanted]
+    if len(keep) == len(header):
+        return header, rows
+    return [header[i] for i in keep], _project_rows(keep, rows)
+
+
+def _project_rows(keep, rows):
+    if not keep:
+        yield from ([] for _ in rows)
+        return
+    take = itemgetter(*keep) if len(keep) > 1 else lambda row: (row[keep[0]],)
+    width = keep[-1] + 1
+    for row in rows:
+        if len(row) >= width:
+            yield list(take(row))
+        else:
+            # keep is ascending, so a short row loses exactly the trailing
+            # columns it would have lost unprojected
+            yield [row[i] for i in keep if i < len(row)]
+
+
+def _record(spec, header):
+    # Builds one output record per row, as dict(zip(header, row)) does
+    if not spec.compact:
+        return lambda row: dict(zip(header, row))
+    # Later columns win on a duplicated header name, as in the dict
+    index = {name: i for i, name in enumerate(header)}
+    width = len(header)
+    values = {}
+    if not spec.chunk_size:
+        return lambda row: Row(index, tuple(values.setdefault(v, v) for v in row[:width]))
+    left = spec.chunk_size
+
+    def record(row):
+        nonlocal values, left
+        if not left:
+            values, left = {}, spec.chunk_size
+        left -= 1
+        return Row(index, tuple(values.setdefault(v, v) for v in row[:width]))
+    return record
+
+
+def iter_csv_rows(path, spec):
+    # One line is parsed at a time, which is within any chunk_size
+    with open(path, "r", encoding="utf-8-sig") as f:
+        yield from csv.reader(f, delimiter=spec.delimiter)
+
+
+def _column(header, col):
+    if isinstance(col, int):
+        return col
+    try:
+        return header.index(col)
+    except ValueError:
+        return None
+
+
+def _rows(spec, header, rows, width):
+    # Skips blank lines and rows too short for the columns the fold reads,
+    # and applies the per-column converters in place.
+    converters = [(_column(header, col), fn) for col, fn in (spec.converters or {}).items()]
+    converters = [(i, fn) for i, fn in converters if i is not None]
+    for row in rows:
+        if len(row) < width or not any(row):
+            continue
+        for i, fn in converters:
+            if i < len(row):
+                row[i] = fn(row[i])
+        yield row
+
+
+def _fold_records(spec, header, rows):
+    if not spec.fields:
+        return [dict(zip(header, row)) for row in _rows(spec, header, rows, 1)]
+    fields = [(name, _column(header, col)) for name, col in spec.fields.items()]
+    width = max((i for _, i in fields if i is not None), default=0) + 1
+    return [
+        {name: row[i] if i is not None else None for name, i in fields}
+        for row in _rows(spec, header, rows, width)
+    ]
+
+
+def _fold_raw(spec, header, rows):
+    return list(_rows(spec, header, rows, 1))
+
+
+def _fold_unique(spec, header, rows):
+    key = _column(header, spec.key)
+    if key is None:
+        return {}
+    record = _record(spec, header)
+    out = {}
+    for row in _rows(spec, header, rows, key + 1):
+        if row[key]:
+            out[row[key]] = record(row)
+    return out
+
+
+def _fold_group(spec, header, rows):
+    key = _column(header, spec.key)
+    if key is None:
+        return {}
+    record = _record(spec, header)
+    out = {}
+    for row in _rows(spec, header, rows, key + 1):
+        if row[key]:
+            out.setdefault(row[key], []).append(record(row))
+    return out
+
+
+def _fold_kv(spec, header, rows):
+    key = _column(header, spec.key)
+    name, value = (_column(header, col) for col in spec.value)
+    if None in (key, name, value):
+        return {}
+    out = {}
+    for row in _rows(spec, header, rows, max(key, name, value) + 1):
+        out.setdefault(row[key], {})[row[name]] = row[value]
+    return out
+
+
+def _fold_map(spec, header, rows):
+    key = _column(header, spec.key)
+    value = _column(header, spec.value)
+    if None in (key, value):
+        return {}
+    return {row[key]: row[value] for row in _rows(spec, header, rows, max(key, value) + 1)}
+
+
+def _fold_unpivot(spec, header, rows):
+    key = _column(header, spec.key)
+    if key is None:
+        return {}
+    skipped = {key} | {_column(header, col) for col in spec.value or ()}
+    columns = [(i, name) for i, name in enumerate(header) if i not in skipped]
+    out = {name: [] for _, name in columns}
+    for row in _rows(spec, header, rows, key + 1):
+        if not row[key]:
+            continue
+        for i, name in columns:
+            if i < len(row) and row[i] not in NA_VALUES:
+                out[name].append((row[key], row[i]))
+    return out
+
+
+def _fold_genres(spec, header, rows):
+    # TermID;GenreType;OrderIndex/Mapping;en-EU;en-IE. Service and replay
+    # rows name the genres (en-IE); mapping rows give a genre's order, with
+    # its parent and replay genre ids in the two name columns.
+    def cell(row, i):
+        return row[i] if i < len(row) else ""
+
+    rows = list(_rows(spec, header, rows, 2))
+    names = {row[0]: cell(row, 4) for row in rows if row[1] in ("service", "replay")}
+    out = {"serviceGenre": [], "replayGenre": [], "genre": []}
+    for row in rows:
+        term_id, genre_type, order = row[0], row[1], cell(row, 2)
+        order = int(order) if order else 0
+        if genre_type == "service":
+            out["serviceGenre"].append(
+                {"id": term_id, "name": cell(row, 4), "applications": [], "default": "false", "order": order}
+            )
+        elif genre_type == "replay":
+            out["replayGenre"].append({"id": term_id, "name": cell(row, 4), "order": order})
+        elif genre_type == "mapping":
+            out["genre"].append({
+                "id": term_id,
+                "name": names.get(term_id),
+                "order": order,
+                "parentId": cell(row, 3) or None,
+                "replayGenreId": cell(row, 4) or None,
+            })
+    return out
+
+
+_FOLDS = {
+    "records": _fold_records,
+    "raw": _fold_raw,
+    "unique": _fold_unique,
+    "group": _fold_group,
+    "kv": _fold_kv,
+    "map": _fold_map,
+    "unpivot": _fold_unpivot,
+    "genres": _fold_genres,
+}
+
+
+def file_digest(path):
+    if not os.path.exists(path):
+        return "missing"
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def table_path(input_dir, spec):
+    path = f"{input_dir}/{spec.file}"
+    if glob.has_magic(spec.file):
+        matches = sorted(glob.glob(f"{glob.escape(input_dir)}/{spec.file}"))
+        if matches:
+            return matches[0]
+    return path
+
+
+def _load_ini(path):
+    parser = configparser.ConfigParser(interpolation=None)
+    # Option names are case sensitive (Poster_URI_ToBePrefixed, host names)
+    parser.optionxform = str
+    with open(path, "r", encoding="utf-8-sig") as f:
+        parser.read_file(f)
+    return {section: dict(parser.items(section)) for section in parser.sections()}
+
+
+def line_count(path):
+    if not os.path.exists(path):
+        return 0
+    lines, last = 0, b"\n"
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            lines += chunk.count(b"\n")
+            last = chunk[-1:]
+    # A last line without a trailing newline still counts
+    return lines + (last != b"\n")
+
+
+def chunk_rows(path, spec, memory_budget):
+    # Rows per chunk for about memory_budget bytes of parsed rows: the text
+    # of an average line plus a str object and a pointer per cell. The
+    # average line is measured on the start of the file rather than by
+    # reading all of it.
+    with open(path, "rb") as f:
+        sample = f.read(1 << 16)
+    lines = sample.split(b"\n")
+    cells = len(lines[0].decode("utf-8-sig", "replace").split(spec.delimiter))
+    # The last line of the sample may be cut short (or empty)
+    rows = [line for line in lines[spec.header_rows:-1] if line]
+    line_bytes = sum(map(len, rows)) / len(rows) + 1 if rows else len(sample)
+    per_row = line_bytes + cells * (sys.getsizeof("") + 8) + sys.getsizeof([])
+    return max(int(memory_budget // per_row), 1)
+
+
+def empty_table(spec):
+    if spec.mode == "genres":
+        return _fold_genres(spec, [], [])
+    return [] if spec.mode in ("records", "raw") else {}
+
+
+def _snapshot_rows(path, spec, reader, snapshot_dir):
+    variant = f"rows:{reader.__module__}.{reader.__qualname__}:{spec.delimiter}"
+    target = snapshot.snapshot_file(snapshot_dir, file_digest(path), variant)
+    if os.path.exists(target):
+        snap = snapshot.Snapshot(target)
+        # Columns are stored separately, so a projected table only decodes
+        # the ones it keeps
+        wanted = projected_columns(spec)
+        keep = None
+        if wanted is not None:
+            keep = [i for i, name in enumerate(snap.names) if name is not None and name.strip() in wanted]
+        return snap.iter_rows(keep, spec.chunk_size)
+    if spec.chunk_size:
+        # Writing a snapshot needs the whole table in memory
+        return reader(path, spec)
+    rows = list(reader(path, spec))
+    header = rows[spec.header_rows - 1] if 0 < spec.header_rows <= len(rows) else []
+    snapshot.write_rows(target, rows, header)
+    return rows
+
+
+def load_table(spec, input_dir, reader=iter_csv_rows, compact=False, memory_budget=None, snapshot_dir=None):
+    # memory_budget (bytes) folds the table in chunks of about that many
+    # bytes of parsed rows (see chunk_rows): records are stored compact, the
+    # reader or snapshot hands over one chunk at a time (a table without a
+    # snapshot is not snapshotted), and repeated values are shared per chunk.
+    # snapshot_dir keeps the parsed rows there keyed by the source file's
+    # hash; an unchanged file is then memory-mapped instead of parsed.
+    if isinstance(spec, str):
+        spec = TABLES[spec]
+    if compact or memory_budget:
+        spec = replace(spec, compact=True)
+    path = table_path(input_dir, spec)
+    if spec.optional and not os.path.exists(path):
+        print(f"Warning: File not found at {path}")
+        return empty_table(spec)
+    if spec.mode == "ini":
+        return _load_ini(path)
+    if memory_budget:
+        spec = replace(spec, chunk_size=chunk_rows(path, spec, memory_budget))
+    if snapshot_dir:
+        rows = iter(_snapshot_rows(path, spec, reader, snapshot_dir))
+    else:
+        rows = iter(reader(path, spec))
+    header = []
+    for _ in range(spec.header_rows):
+        header = [h.strip() for h in next(rows, [])]
+    header, rows = _project(spec, header, rows)
+    return _FOLDS[spec.mode](spec, header, rows)
+
+
+def load_tables(input_dir, readers, workers=None, processes=False):
+    # The readers are independent, so they run side by side. workers=1 keeps
+    # everything on the calling thread; processes=True sidesteps the GIL for
+    # the pure-python csv engine at the cost of pickling the results back.
+    if workers is None:
+        workers = min(len(readers), os.cpu_count() or 1)
+    if workers <= 1:
+        return {name: read(input_dir) for name, read in readers.items()}
+    pool_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with pool_class(max_workers=workers) as pool:
+        futures = {name: pool.submit(read, input_dir) for name, read in readers.items()}
+        return {name: future.result() for name, future in futures.items()}
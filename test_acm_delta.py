@@ -0,0 +1,66 @@
+import copy
+
+from acm_delta import apply_patch, make_patch
+
+
+def _document():
+    return {
+        "channels": [{"id": f"SVC{i}", "title": f"Channel {i}", "locations": [f"qam-{i}"]} for i in range(6)],
+        "providers": [
+            {"ProviderKey": "SKY", "ProviderName": "SKY", "Type": "group"},
+            {"ProviderKey": "SKY", "ProviderName": "SKY", "Type": "content"},
+            {"ProviderKey": "1001", "ProviderName": "Arrivo", "Type": "content"},
+            {"ProviderKey": "1002", "ProviderName": "Boxer", "Type": "content"},
+        ],
+        "cityIdMapping": {"100": "Default"},
+    }
+
+
+def _round_trip(old, new):
+    patch = make_patch(old, new)
+    assert apply_patch(copy.deepcopy(old), patch) == new
+    return patch
+
+
+def test_unchanged_document_has_an_empty_patch():
+    assert make_patch(_document(), _document()) == []
+
+
+def test_round_trip():
+    old = _document()
+    new = copy.deepcopy(old)
+    del new["channels"][1]
+    new["channels"][3]["locations"].append("ip-1")
+    new["channels"].append({"id": "SVC9", "title": "Channel 9", "locations": []})
+    new["cityIdMapping"] = {"100": "Default", "101": "Dublin"}
+    new["providers"].reverse()
+
+    _round_trip(old, new)
+
+
+def test_insert_in_the_middle_of_a_keyed_list():
+    old = _document()
+    new = copy.deepcopy(old)
+    channel = {"id": "SVC10", "title": "Channel 10", "locations": []}
+    new["channels"].insert(3, channel)
+
+    assert _round_trip(old, new) == [{"op": "add", "path": "/channels/3", "value": channel}]
+
+
+def test_reorder_is_moves():
+    old = _document()
+    new = copy.deepcopy(old)
+    channels = new["channels"]
+    channels[1], channels[4] = channels[4], channels[1]
+
+    patch = _round_trip(old, new)
+
+    assert [op["op"] for op in patch] == ["move", "move"]
+
+
+def test_provider_rename_is_one_replace():
+    old = _document()
+    new = copy.deepcopy(old)
+    new["providers"][3]["ProviderName"] = "Boxer TV"
+
+    assert _round_trip(old, new) == [{"op": "replace", "path": "/providers/3/ProviderName", "value": "Boxer TV"}]
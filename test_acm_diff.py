@@ -0,0 +1,61 @@
+import copy
+
+from acm_diff import diff, summarize
+
+
+def _providers():
+    # A brand's group and content providers share their ProviderKey
+    return [
+        {"ProviderKey": "SKY", "ProviderName": "SKY", "ProviderId": "", "Type": "group"},
+        {"ProviderKey": "SKY", "ProviderName": "SKY", "ProviderId": "SKY", "Type": "content"},
+        {"ProviderKey": "1001", "ProviderName": "Arrivo", "ProviderId": "1001", "Type": "content"},
+        {"ProviderKey": "1002", "ProviderName": "Boxer", "ProviderId": "1002", "Type": "content"},
+        {"ProviderKey": "1003", "ProviderName": "Cinemax", "ProviderId": "1003", "Type": "content"},
+    ]
+
+
+def test_provider_removed_from_the_middle():
+    old = {"providers": _providers()}
+    new = copy.deepcopy(old)
+    del new["providers"][2]
+
+    changes = diff(old, new)
+
+    assert changes == [{"path": "$.providers[type/key=content/1001]", "kind": "removed", "left": old["providers"][2]}]
+    assert summarize(changes) == {"providers": {"added": 0, "removed": 1, "changed": 0}}
+
+
+def test_provider_renamed():
+    old = {"providers": _providers()}
+    new = copy.deepcopy(old)
+    new["providers"][3]["ProviderName"] = "Boxer TV"
+
+    assert diff(old, new) == [
+        {"path": "$.providers[type/key=content/1002].ProviderName", "kind": "changed", "left": "Boxer",
+         "right": "Boxer TV"},
+    ]
+
+
+def test_generated_providers_line_up_with_reference_providers():
+    generated = {"providers": [{"Type": "group", "ProviderKey": "SKY"}, {"Type": "content", "ProviderKey": "SKY"}]}
+    reference = {"providers": [{"type": "content", "key": "SKY"}, {"type": "group", "key": "SKY"}]}
+
+    changes = diff(generated, reference)
+
+    assert [(change["path"], change["kind"]) for change in changes] == [
+        ("$.providers[type/key=group/SKY].Type", "removed"),
+        ("$.providers[type/key=group/SKY].ProviderKey", "removed"),
+        ("$.providers[type/key=group/SKY].type", "added"),
+        ("$.providers[type/key=group/SKY].key", "added"),
+        ("$.providers[type/key=content/SKY].Type", "removed"),
+        ("$.providers[type/key=content/SKY].ProviderKey", "removed"),
+        ("$.providers[type/key=content/SKY].type", "added"),
+        ("$.providers[type/key=content/SKY].key", "added"),
+    ]
+
+
+def test_channel_inserted_in_the_middle():
+    old = {"channels": [{"id": "A", "title": "a"}, {"id": "B", "title": "b"}]}
+    new = {"channels": [{"id": "A", "title": "a"}, {"id": "N", "title": "n"}, {"id": "B", "title": "b"}]}
+
+    assert diff(old, new) == [{"path": "$.channels[serviceId=N]", "kind": "added", "right": {"id": "N", "title": "n"}}]
@@ -0,0 +1,74 @@
+import os
+
+import snapshot
+from tables import TableSpec, load_table
+
+CSV = """ServiceId;QAMRegion;Frequency;CpeType;Notes
+SVC1;40001;474000000;EOS;first
+SVC1;40002;482000000;EOS
+SVC2;40001;;APOLLO;x;extra
+
+SVC3;40003;0490;EOS;
+"""
+
+
+def _input(tmp_path):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    (input_dir / "qam.csv").write_text(CSV, encoding="utf-8")
+    return str(input_dir)
+
+
+def _spec(**options):
+    return TableSpec("qam.csv", mode="group", key="ServiceId", **options)
+
+
+def test_snapshot_read_matches_the_csv(tmp_path):
+    input_dir, snapshot_dir = _input(tmp_path), str(tmp_path / "snapshots")
+    parsed = load_table(_spec(), input_dir)
+
+    written = load_table(_spec(), input_dir, snapshot_dir=snapshot_dir)
+    assert len(os.listdir(snapshot_dir)) == 1
+    read = load_table(_spec(), input_dir, snapshot_dir=snapshot_dir)
+
+    assert written == parsed
+    assert read == parsed
+    # A short row stays short, a leading zero keeps the cell text
+    assert read["SVC1"][1] == {"ServiceId": "SVC1", "QAMRegion": "40002", "Frequency": "482000000", "CpeType": "EOS"}
+    assert read["SVC3"][0]["Frequency"] == "0490"
+
+
+def test_snapshot_read_is_projected_and_chunked(tmp_path):
+    input_dir, snapshot_dir = _input(tmp_path), str(tmp_path / "snapshots")
+    spec = _spec(columns=("Frequency",))
+    load_table(spec, input_dir, snapshot_dir=snapshot_dir)
+
+    read = load_table(spec, input_dir, snapshot_dir=snapshot_dir, memory_budget=1)
+
+    assert read == load_table(spec, input_dir)
+    assert read["SVC2"][0] == {"ServiceId": "SVC2", "Frequency": ""}
+
+
+def test_changed_file_is_parsed_again(tmp_path):
+    input_dir, snapshot_dir = _input(tmp_path), str(tmp_path / "snapshots")
+    load_table(_spec(), input_dir, snapshot_dir=snapshot_dir)
+    with open(os.path.join(input_dir, "qam.csv"), "a", encoding="utf-8") as f:
+        f.write("SVC4;40004;498000000;EOS;new\n")
+
+    read = load_table(_spec(), input_dir, snapshot_dir=snapshot_dir)
+
+    assert read["SVC4"][0]["Notes"] == "new"
+    assert len(os.listdir(snapshot_dir)) == 2
+
+
+def test_columns_round_trip(tmp_path):
+    path = str(tmp_path / "table.snap")
+    snapshot.write_snapshot(path, ["n", "text"], [["1", "", None, "-7"], ["a", None, "a", "b"]])
+
+    snap = snapshot.Snapshot(path)
+
+    assert snap.rows == 4
+    assert snap.is_int(0) and not snap.is_int(1)
+    assert snap.column(0) == ["1", "", None, "-7"]
+    assert snap.column(1) == ["a", None, "a", "b"]
+    assert list(snap.iter_rows(chunk_rows=3)) == [["1", "a"], [""], [None, "a"], ["-7", "b"]]
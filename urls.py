@@ -0,0 +1,89 @@
+import re
+
+from tables import load_table
+
+# Rewrites the URLs of the published document from the endpoints cfg that
+# ships with each deployment, so the same CSVs can be promoted between
+# environments. Two kinds of rules are read:
+#
+#   [endpoints]
+#   Poster_URI_ToBeReplaced<n> = <placeholder>   a value starting with the
+#   Poster_URI_ToBePrefixed = <image base URL>   placeholder gets the base
+#                                                URL in its place
+#   [hosts]
+#   <source host> = <host of this environment>   host of any URL
+#
+# All rules are compiled into one alternation, so a value is scanned once
+# whatever the number of rules. Rewritten values are cached, and the hits of
+# every rule are counted per rewritten field; both engines' build_sections()
+# start the count again, so it covers one generation even where the loaded
+# rewriter is reused (watch, serve) and ends up in its metrics.
+
+PLACEHOLDER_PREFIX = "Poster_URI_ToBeReplaced"
+
+# providers.csv is published verbatim apart from these
+PROVIDER_URL_COLUMNS = ("ProviderLogo",)
+
+
+class URLRewriter:
+    def __init__(self, cfg=None):
+        cfg = cfg or {}
+        rules = []
+        endpoints = cfg.get("endpoints", {})
+        base = endpoints.get("Poster_URI_ToBePrefixed")
+        if base:
+            placeholders = [(name, value) for name, value in endpoints.items()
+                            if name.startswith(PLACEHOLDER_PREFIX) and value]
+            # Longest first, so file:/// is replaced before file:// can match
+            for name, value in sorted(placeholders, key=lambda rule: -len(rule[1])):
+                rules.append((name, "^" + re.escape(value), base))
+        for host, replacement in cfg.get("hosts", {}).items():
+            rules.append((f"hosts:{host}", f"(?<=://)(?i:{re.escape(host)})(?=[/:?#]|$)", replacement))
+
+        self.names = [name for name, _, _ in rules]
+        self.replacements = [replacement for _, _, replacement in rules]
+        # One group per rule; match.lastindex tells which one matched
+        self.pattern = re.compile("|".join(f"({source})" for _, source, _ in rules)) if rules else None
+        self._cache = {}
+        self.reset()
+
+    def reset(self):
+        self.hits = dict.fromkeys(self.names, 0)
+
+    def __call__(self, value, count=True):
+        # count=False for a second pass over fields already counted
+        if not value or self.pattern is None:
+            return value
+        try:
+            result, fired = self._cache[value]
+        except KeyError:
+            fired = []
+
+            def replace(match):
+                fired.append(match.lastindex - 1)
+                return self.replacements[match.lastindex - 1]
+
+            result = self.pattern.sub(replace, value)
+            self._cache[value] = result, fired
+        if count:
+            for i in fired:
+                self.hits[self.names[i]] += 1
+        return result
+
+    def uncounted(self, value):
+        return self(value, count=False)
+
+    def rewrite_rows(self, rows, columns=PROVIDER_URL_COLUMNS):
+        if self.pattern is None:
+            return rows
+        return [{**row, **{col: self(row[col]) for col in columns if col in row}} for row in rows]
+
+
+def load_rewriter(input_dir):
+    return URLRewriter(load_table("endpoints", input_dir))
+
+
+def url_rewriter(data):
+    # The rewriter loaded into data, or one without rules where the
+    # endpoints table was not read (see render_cached)
+    return data.get("endpoints") or URLRewriter()
@@ -0,0 +1,369 @@
+import argparse
+import json
+import queue
+import sys
+import threading
+
+from writer import RawJSON, StreamObject, is_stream
+
+# Schema of the ACM document, compiled once into one check function per
+# section. generate_json(validate=True) runs the checks on each section, and
+# on each item of a streamed section (channels, lineups, locations), as the
+# writer consumes it, so bad output is caught before it replaces the
+# previous document (see write_json) without loading the written file back.
+#
+# Schema notation:
+#   str, int, bool, ...   isinstance check (int never accepts a bool)
+#   {"key": spec, ...}    object with exactly these required keys
+#   ListOf(spec)          list (or tuple) of items
+#   MapOf(spec)           object with arbitrary string keys
+#   OneOf(a, b, ...)      one of the listed values
+#   Nullable(spec)        None or spec
+#   ANY                   anything
+
+
+class ListOf:
+    def __init__(self, item):
+        self.item = item
+
+
+class MapOf:
+    def __init__(self, value):
+        self.value = value
+
+
+class OneOf:
+    def __init__(self, *values):
+        self.values = values
+
+
+class Nullable:
+    def __init__(self, spec):
+        self.spec = spec
+
+
+ANY = object()
+
+TEXT = Nullable(str)
+NUMBER = Nullable(int)
+STREAMING_PROTOCOLS = OneOf(None, "", "dash", "dash-sd", "hls")
+
+QAM_LOCATION = {
+    "id": str,
+    "type": OneOf("qam"),
+    "frequency": NUMBER,
+    "symbolRate": NUMBER,
+    "modulation": NUMBER,
+    "fecInner": NUMBER,
+    "fecOuter": NUMBER,
+    "programNumber": NUMBER,
+    "ipLocationUrl": TEXT,
+    "cpeType": TEXT,
+    "drmProtectionKey": TEXT,
+    "streamingProtocol": STREAMING_PROTOCOLS,
+}
+
+IP_LOCATION = {
+    "id": str,
+    "type": OneOf("ott"),
+    "url": TEXT,
+    "cpeType": TEXT,
+    "drmProtectionKey": TEXT,
+    "streamingProtocol": STREAMING_PROTOCOLS,
+}
+
+APPLICATION = {
+    "id": TEXT,
+    "trigger": TEXT,
+    "delay": int,
+    "displayTime": int,
+    "repeat": int,
+    "channelBound": ListOf(str),
+    "logo": TEXT,
+    "poster": TEXT,
+    "synopsis": Nullable(MapOf(str)),
+    "toasterMessage": Nullable(MapOf(str)),
+}
+
+CHANNEL = {
+    "id": str,
+    "title": TEXT,
+    "description": TEXT,
+    "longDescription": TEXT,
+    "type": TEXT,
+    "serviceGenreIds": ListOf(str),
+    "replayable": bool,
+    "startOver": bool,
+    "catchUp": bool,
+    "ottFollow": bool,
+    "casId": TEXT,
+    "providerId": TEXT,
+    "logo": TEXT,
+    "poster": TEXT,
+    "serviceGroups": ListOf(str),
+    "productizationRefs": ListOf(str),
+    "ldvrAuthRestrictions": Nullable(MapOf(bool)),
+    "replaySources": Nullable(ListOf(str)),
+    "locations": ListOf(str),
+    "applications": ListOf(APPLICATION),
+    "avad": MapOf(str),
+    "tstv": MapOf(str),
+    "trickplay": MapOf(str),
+}
+
+LINEUP = {
+    "channelMapGroup": str,
+    "lineup": ListOf({"serviceId": str, "channelNumbers": ListOf(int)}),
+}
+
+SCHEMA = {
+    "diagnostics": {"source": str, "generationDate": str},
+    "classifications": {
+        "serviceGenre": ListOf({"id": str, "name": str, "applications": ListOf(ANY), "default": str, "order": int}),
+        "replayGenre": ListOf({"id": str, "name": str, "order": int}),
+        "genre": ListOf({"id": str, "name": TEXT, "order": int, "parentId": TEXT, "replayGenreId": TEXT}),
+    },
+    "recommendationTopics": ListOf(ANY),
+    "deployment": {"id": str, "deploymentDate": str},
+    "cityIdMapping": MapOf(str),
+    "productizing": {
+        "linear": ListOf({"id": str, "edsId": TEXT}),
+        "replay": ListOf({"id": str, "edsId": TEXT}),
+    },
+    "channels": ListOf(CHANNEL),
+    "lineups": ListOf(LINEUP),
+    "locations": {
+        "qamLocations": ListOf({"lsa": TEXT, "locations": ListOf(QAM_LOCATION)}),
+        "ipLocations": ListOf(IP_LOCATION),
+    },
+    "relatedMaterials": ListOf(ANY),
+    "applications": ListOf(ANY),
+    "providers": ListOf(MapOf(str)),
+}
+
+
+class ValidationError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} validation error(s):\n" + "\n".join(errors[:20]))
+
+
+def _type_name(value):
+    return "null" if value is None else type(value).__name__
+
+
+def compile_schema(spec):
+    # Returns check(value, path, errors), which appends a message to errors
+    # for every mismatch under path
+    if spec is ANY:
+        return lambda value, path, errors: None
+
+    if isinstance(spec, Nullable):
+        inner = compile_schema(spec.spec)
+
+        def check(value, path, errors):
+            if value is not None:
+                inner(value, path, errors)
+        return check
+
+    if isinstance(spec, OneOf):
+        allowed = spec.values
+
+        def check(value, path, errors):
+            if value not in allowed:
+                errors.append(f"{path}: {value!r} is not one of {', '.join(map(repr, allowed))}")
+        return check
+
+    if isinstance(spec, ListOf):
+        item = compile_schema(spec.item)
+
+        def check(value, path, errors):
+            if not isinstance(value, (list, tuple)):
+                errors.append(f"{path}: expected a list, got {_type_name(value)}")
+                return
+            for i, element in enumerate(value):
+                item(element, f"{path}[{i}]", errors)
+        return check
+
+    if isinstance(spec, MapOf):
+        item = compile_schema(spec.value)
+
+        def check(value, path, errors):
+            if not isinstance(value, dict):
+                errors.append(f"{path}: expected an object, got {_type_name(value)}")
+                return
+            for key, element in value.items():
+                item(element, f"{path}.{key}", errors)
+        return check
+
+    if isinstance(spec, dict):
+        fields = {key: compile_schema(field) for key, field in spec.items()}
+
+        def check(value, path, errors):
+            if not isinstance(value, dict):
+                errors.append(f"{path}: expected an object, got {_type_name(value)}")
+                return
+            for key, field in fields.items():
+                if key in value:
+                    field(value[key], f"{path}.{key}", errors)
+                else:
+                    errors.append(f"{path}: missing {key!r}")
+            for key in value.keys() - fields.keys():
+                errors.append(f"{path}: unexpected {key!r}")
+        return check
+
+    if spec is int:
+        def check(value, path, errors):
+            if not isinstance(value, int) or isinstance(value, bool):
+                errors.append(f"{path}: expected int, got {_type_name(value)}")
+        return check
+
+    def check(value, path, errors):
+        if not isinstance(value, spec):
+            errors.append(f"{path}: expected {spec.__name__}, got {_type_name(value)}")
+    return check
+
+
+SECTION_CHECKS = {section: compile_schema(spec) for section, spec in SCHEMA.items()}
+
+
+def _member_keys(fields):
+    def check(value, path, errors):
+        for key in fields - value.keys():
+            errors.append(f"{path}: missing {key!r}")
+        for key in value.keys() - fields:
+            errors.append(f"{path}: unexpected {key!r}")
+    return check
+
+
+def compile_stream_schema(spec):
+    # Returns wrap(value, path, runner): a value the writer can stream is
+    # wrapped so each item is checked as it is pulled, anything else is
+    # checked whole
+    check = compile_schema(spec)
+    if isinstance(spec, ListOf):
+        item = compile_stream_schema(spec.item)
+
+        def wrap(value, path, runner):
+            if is_stream(value):
+                return (item(element, f"{path}[{i}]", runner) for i, element in enumerate(value))
+            runner.submit(check, value, path)
+            return value
+        return wrap
+
+    if isinstance(spec, dict):
+        fields = {key: compile_stream_schema(field) for key, field in spec.items()}
+        keys = _member_keys(fields.keys())
+
+        def wrap(value, path, runner):
+            if isinstance(value, StreamObject):
+                runner.submit(keys, value, path)
+                return StreamObject(
+                    (key, fields[key](member, f"{path}.{key}", runner) if key in fields else member)
+                    for key, member in value.items()
+                )
+            runner.submit(check, value, path)
+            return value
+        return wrap
+
+    def wrap(value, path, runner):
+        runner.submit(check, value, path)
+        return value
+    return wrap
+
+
+STREAM_CHECKS = {section: compile_stream_schema(spec) for section, spec in SCHEMA.items()}
+
+
+def check_document(document):
+    errors = []
+    for section, check in SECTION_CHECKS.items():
+        if section in document:
+            check(document[section], f"$.{section}", errors)
+        else:
+            errors.append(f"$: missing {section!r}")
+    for section in document.keys() - SECTION_CHECKS.keys():
+        errors.append(f"$: unexpected {section!r}")
+    return errors
+
+
+class _Inline:
+    def __init__(self):
+        self.errors = []
+
+    def submit(self, check, value, path):
+        check(value, path, self.errors)
+
+    def finish(self):
+        return self.errors
+
+
+class _Worker(_Inline):
+    # Runs the checks on a background thread while the writer keeps going
+    def __init__(self):
+        super().__init__()
+        self.queue = queue.Queue(maxsize=1024)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            super().submit(*job)
+
+    def submit(self, check, value, path):
+        self.queue.put((check, value, path))
+
+    def finish(self):
+        self.queue.put(None)
+        self.thread.join()
+        return self.errors
+
+
+def _checked_callable(fn, wrap, path, runner):
+    def render():
+        return wrap(fn(), path, runner)
+    return render
+
+
+def validated(sections, threaded=False):
+    # Yields the (name, value) pairs of sections with every value checked as
+    # the writer pulls it; raises ValidationError once the last section has
+    # been consumed. RawJSON fragments (the section cache) are already
+    # serialized and are passed through unchecked.
+    runner = _Worker() if threaded else _Inline()
+    for section in SECTION_CHECKS.keys() - sections.keys():
+        runner.errors.append(f"$: missing {section!r}")
+    for section, value in sections.items():
+        path = f"$.{section}"
+        if section not in SECTION_CHECKS:
+            runner.errors.append(f"$: unexpected {section!r}")
+        elif isinstance(value, RawJSON):
+            pass
+        elif callable(value):
+            value = _checked_callable(value, STREAM_CHECKS[section], path, runner)
+        else:
+            value = STREAM_CHECKS[section](value, path, runner)
+        yield section, value
+    errors = runner.finish()
+    if errors:
+        raise ValidationError(errors)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate a written ACM document against the schema.")
+    parser.add_argument("file", nargs="?", default="output/output.json")
+    args = parser.parse_args(argv)
+
+    with open(args.file, "r") as f:
+        errors = check_document(json.load(f))
+    for error in errors:
+        print(error)
+    print(f"{args.file}: {len(errors)} error(s)" if errors else f"{args.file}: valid")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import argparse
+import importlib
+import os
+import time
+
+from batch import ENGINES
+from section_cache import SECTION_TABLES, file_digest
+from tables import TABLES, table_path
+from writer import FORMATS, RawJSON, iter_section, write_json
+
+# Long-running regeneration for people editing the input sheets. Parsed
+# tables and rendered sections stay in memory between runs; each poll only
+# stats the inputs, a file whose mtime or size moved is hashed, and only a
+# file whose content actually changed is parsed again. Sections that do not
+# depend on it are spliced back in from the previous render.
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class WarmState:
+    # signatures/digests describe the inputs of the last successful render;
+    # seen is what the last poll found, and pending the tables whose seen
+    # content has not been rendered yet. A render that fails (a sheet saved
+    # mid-edit) changes none of them, so its tables are rendered again with
+    # the next change.
+    def __init__(self, engine, input_dir, deployment_id=None, output_format="pretty", compact=False):
+        self.engine = engine
+        self.input_dir = input_dir
+        self.deployment_id = deployment_id or engine.DEFAULT_DEPLOYMENT
+        self.output_format = output_format
+        self.readers = engine.COMPACT_READERS if compact else engine.READERS
+        self.signatures = {}
+        self.digests = {}
+        self.seen = {}
+        self.pending = set()
+        self.data = {}
+        self.fragments = {}
+
+    def _path(self, name):
+        return table_path(self.input_dir, TABLES[name])
+
+    def poll(self):
+        # Returns the tables whose content moved since the last poll; they
+        # join pending until a render of them succeeds
+        changed = []
+        for name in self.readers:
+            signature = _signature(self._path(name))
+            if name in self.seen and signature == self.seen[name][0]:
+                continue
+            digest = file_digest(self._path(name))
+            if name in self.seen and digest == self.seen[name][1]:
+                self.seen[name] = signature, digest
+                continue
+            self.seen[name] = signature, digest
+            changed.append(name)
+            if name in self.data and digest == self.digests[name]:
+                # Back to the content last rendered
+                self.pending.discard(name)
+            else:
+                self.pending.add(name)
+        return changed
+
+    def reload(self):
+        # Reads and renders the pending tables; returns (tables, sections)
+        # rendered. Nothing is kept unless every stale section renders.
+        tables = [name for name in self.readers if name in self.pending]
+        seen = {name: self.seen[name] for name in tables}
+        data = {**self.data, **{name: self.readers[name](self.input_dir) for name in tables}}
+        stale = [
+            section for section, names in SECTION_TABLES.items()
+            if section not in self.fragments or set(names) & set(tables)
+        ]
+        sections = self.engine.build_sections(data, stream=True, deployment_id=self.deployment_id)
+        fragments = {
+            section: RawJSON("".join(iter_section(sections[section], FORMATS[self.output_format])))
+            for section in stale
+        }
+        self.data = data
+        self.fragments.update(fragments)
+        for name, (signature, digest) in seen.items():
+            self.signatures[name], self.digests[name] = signature, digest
+        self.pending.difference_update(tables)
+        return tables, stale
+
+    def write(self, output_file):
+        write_json({section: self.fragments[section] for section in SECTION_TABLES}, output_file,
+                   output_format=self.output_format)
+
+
+def watch(engine_name, input_dir, output_file, interval=0.5, deployment_id=None, output_format="pretty",
+          compact=False, once=False):
+    state = WarmState(importlib.import_module(ENGINES[engine_name]), input_dir, deployment_id, output_format,
+                      compact)
+    while True:
+        if state.poll() and state.pending:
+            started = time.perf_counter()
+            try:
+                tables, stale = state.reload()
+                state.write(output_file)
+            except Exception as e:
+                # Keep watching; the tables stay pending for the next edit
+                print(f"Error: regeneration failed, {output_file} left as it was "
+                      f"(pending: {', '.join(sorted(state.pending))}): {type(e).__name__}: {e}")
+            else:
+                print(f"Regenerated {output_file} in {time.perf_counter() - started:.3f}s "
+                      f"(changed: {', '.join(tables)}; rendered {len(stale)} of {len(SECTION_TABLES)} sections)")
+        if once:
+            return state
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate the ACM document whenever an input CSV changes.")
+    parser.add_argument("input_dir", nargs="?", default="input_csv")
+    parser.add_argument("output", nargs="?", default="output/output.json")
+    parser.add_argument("--engine", default="csv", choices=list(ENGINES))
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between polls (default 0.5)")
+    parser.add_argument("--deployment-id")
+    parser.add_argument("--format", default="pretty", choices=list(FORMATS))
+    parser.add_argument("--compact", action="store_true", help="load the wide tables as compact rows")
+    args = parser.parse_args()
+
+    print(f"Watching {args.input_dir} ({args.engine} engine), Ctrl-C to stop")
+    try:
+        watch(args.engine, args.input_dir, args.output, args.interval, args.deployment_id, args.format,
+              args.compact)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import gzip
+import json
+import os
+import types
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Writes the ACM document section by section. A section value may be a
+# generator, in which case it is written as a JSON array one item at a
+# time and never held in memory as a whole, a StreamObject, whose members
+# (streams themselves, or StreamObjects inside a stream) are written the
+# same way, or a zero-argument callable, which is only evaluated once the
+# writer reaches that section.
+#
+# Output formats:
+#   pretty  - byte-identical to json.dump(dict(sections), f, indent=4)
+#   compact - no whitespace, UTF-8; encoded with orjson when it is installed,
+#             otherwise with the stdlib encoder configured to give the same
+#             bytes
+#   gzip    - compact, gzip-compressed as it is written (mtime is zeroed so
+#             identical documents compress to identical bytes)
+
+FORMATS = {
+    "pretty": 4,
+    "compact": None,
+    "gzip": None,
+}
+
+_END = object()
+
+
+def _dumps_compact(value):
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def encode(value, indent=4, level=0):
+    # One value as JSON text, nested level indents deep in the document
+    if indent is None:
+        return _dumps_compact(value)
+    text = json.dumps(value, indent=indent)
+    if level:
+        text = text.replace("\n", "\n" + " " * (indent * level))
+    return text
+
+
+def _iter_array(items, indent, level):
+    items = iter(items)
+    first = next(items, _END)
+    if first is _END:
+        yield "[]"
+        return
+    if indent is None:
+        pad = close = ""
+    else:
+        pad = "\n" + " " * (indent * (level + 1))
+        close = "\n" + " " * (indent * level)
+    separator = "["
+    for item in _chain(first, items):
+        if type(item) is StreamObject:
+            yield separator + pad
+            yield from _iter_members(item.items(), indent, level + 1)
+        else:
+            yield separator + pad + encode(item, indent, level + 1)
+        separator = ","
+    yield close + "]"
+
+
+def _iter_members(members, indent, level):
+    members = iter(members)
+    first = next(members, _END)
+    if first is _END:
+        yield "{}"
+        return
+    if indent is None:
+        pad = close = ""
+        colon = ":"
+    else:
+        pad = "\n" + " " * (indent * (level + 1))
+        close = "\n" + " " * (indent * level)
+        colon = ": "
+    separator = "{"
+    for key, value in _chain(first, members):
+        yield separator + pad + json.dumps(key, ensure_ascii=indent is not None) + colon
+        yield from iter_section(value, indent, level + 1)
+        separator = ","
+    yield close + "}"
+
+
+class RawJSON(str):
+    # A section value that is already serialized at section depth and is
+    # spliced into the document verbatim.
+    pass
+
+
+class StreamObject(dict):
+    # A value written as a JSON object one member at a time
+    pass
+
+
+def is_stream(value):
+    return isinstance(value, (types.GeneratorType, map, filter))
+
+
+def iter_json(sections, indent=4):
+    yield from _iter_members(sections.items() if isinstance(sections, dict) else sections, indent, 0)
+
+
+def iter_section(value, indent=4, level=1):
+    if isinstance(value, RawJSON):
+        yield value
+    elif isinstance(value, StreamObject):
+        yield from _iter_members(value.items(), indent, level)
+    elif is_stream(value):
+        yield from _iter_array(value, indent, level)
+    elif callable(value):
+        yield from iter_section(value(), indent, level)
+    else:
+        yield encode(value, indent, level)
+
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+
+def write_json(sections, output_file, output_format="pretty"):
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown output format {output_format!r}, expected one of {', '.join(FORMATS)}")
+
+    # Create output directory if it doesn't exist
+    output_dir = os.path.dirname(output_file)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    # Written next to the target and renamed over it, so a reader never sees
+    # a half-written document
+    tmp_file = output_file + ".tmp"
+    try:
+        with open(tmp_file, "wb") as raw:
+            f = gzip.GzipFile(filename="", mode="wb", fileobj=raw, mtime=0) if output_format == "gzip" else raw
+            with f:
+                for chunk in iter_json(sections, FORMATS[output_format]):
+                    f.write(chunk.encode("utf-8"))
+        os.replace(tmp_file, output_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)